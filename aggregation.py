@@ -0,0 +1,212 @@
+"""Aggregazione di gruppo delle matrici inviate da più persone.
+
+Gli invii con gli stessi fattori e le stesse alternative vengono impilati in un array
+utenti x fattori x alternative. Su questo array si calcolano, in modo vettoriale:
+punteggio ponderato medio e mediano di ogni alternativa, classifica di consenso con il
+metodo di Borda e con il criterio di Kemeny (la classifica che contraddice il minor
+numero di preferenze a coppie) e dispersione tra i valutatori per ogni fattore.
+
+L'aggiornamento è incrementale: ``GroupAggregate.add_many`` aggiorna somme correnti e
+conteggi a coppie con i soli nuovi invii, senza ricalcolare quelli già visti, e
+``GroupAggregate.remove`` sottrae l'invio precedente di un valutatore che ne ha fatto
+uno nuovo.
+"""
+import itertools
+import threading
+
+import numpy as np
+
+from scoring import check_shapes, score_batch
+
+# Oltre questo numero di alternative la classifica di Kemeny è approssimata (ricerca locale)
+KEMENY_EXACT_MAX = 8
+
+
+class GroupAggregate:
+    def __init__(self, factors, alternatives, capacity=16):
+        self.factors = tuple(factors)
+        self.alternatives = tuple(alternatives)
+        n_factors, n_alternatives = len(self.factors), len(self.alternatives)
+        self.count = 0
+        # Valutatore di ogni riga ("" se sconosciuto) e riga di ogni valutatore
+        self._row_raters = []
+        self._rows = {}
+        # Array utenti x fattori x alternative, con capacità che raddoppia quando serve
+        self._weights = np.empty((capacity, n_factors), dtype=np.int8)
+        self._scores = np.empty((capacity, n_factors, n_alternatives), dtype=np.int8)
+        self._totals = np.empty((capacity, n_alternatives), dtype=np.float64)
+        # Somme correnti
+        self.total_sum = np.zeros(n_alternatives)
+        self.borda_points = np.zeros(n_alternatives)
+        self.pairwise = np.zeros((n_alternatives, n_alternatives))  # [i, j]: quanti preferiscono i a j
+        self._weight_sum = np.zeros(n_factors)
+        self._weight_sq_sum = np.zeros(n_factors)
+        self._score_sum = np.zeros((n_factors, n_alternatives))
+        self._score_sq_sum = np.zeros((n_factors, n_alternatives))
+
+    def _reserve(self, extra):
+        needed = self.count + extra
+        capacity = len(self._weights)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("_weights", "_scores", "_totals"):
+            old = getattr(self, name)
+            new = np.empty((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, weights, scores, rater=""):
+        self.add_many(np.asarray(weights)[np.newaxis], np.asarray(scores)[np.newaxis], [rater])
+
+    def add_many(self, weights, scores, raters=None):
+        """Aggiunge N invii: pesi (N, F) e punteggi (N, F, A), con i rispettivi valutatori."""
+        weights = np.asarray(weights)
+        scores = np.asarray(scores)
+        check_shapes(weights, scores, batch=True, expected=self._scores.shape[1:])
+        n = len(weights)
+        if not n:
+            return
+        totals = score_batch(weights, scores).totals
+
+        self._reserve(n)
+        self._weights[self.count:self.count + n] = weights
+        self._scores[self.count:self.count + n] = scores
+        self._totals[self.count:self.count + n] = totals
+        for row, rater in enumerate(raters or [""] * n, start=self.count):
+            self._row_raters.append(rater)
+            if rater:
+                self._rows[rater] = row
+        self.count += n
+        self._accumulate(weights, scores, totals, 1)
+
+    def remove(self, rater):
+        """Toglie l'invio di ``rater`` dalle somme correnti; False se non è nel gruppo."""
+        row = self._rows.pop(rater, None)
+        if row is None:
+            return False
+        self._accumulate(self._weights[row:row + 1], self._scores[row:row + 1], self._totals[row:row + 1], -1)
+        # L'ultima riga prende il posto di quella tolta
+        last = self.count - 1
+        if row != last:
+            for name in ("_weights", "_scores", "_totals"):
+                array = getattr(self, name)
+                array[row] = array[last]
+            moved = self._row_raters[row] = self._row_raters[last]
+            if moved:
+                self._rows[moved] = row
+        self._row_raters.pop()
+        self.count -= 1
+        return True
+
+    def _accumulate(self, weights, scores, totals, sign):
+        # Aggiunge (sign = 1) o sottrae (sign = -1) N invii dalle somme correnti
+        n = len(totals)
+        # Confronti a coppie tra alternative per ogni utente: (N, A, A)
+        better = totals[:, :, np.newaxis] > totals[:, np.newaxis, :]
+        ties = totals[:, :, np.newaxis] == totals[:, np.newaxis, :]
+        self.total_sum += sign * totals.sum(axis=0)
+        # Borda: un punto per ogni alternativa battuta, mezzo punto per ogni pari merito
+        self.borda_points += sign * (better.sum(axis=(0, 2)) + 0.5 * (ties.sum(axis=(0, 2)) - n))
+        self.pairwise += sign * better.sum(axis=0)
+        weights = weights.astype(np.float64)
+        scores = scores.astype(np.float64)
+        self._weight_sum += sign * weights.sum(axis=0)
+        self._weight_sq_sum += sign * (weights ** 2).sum(axis=0)
+        self._score_sum += sign * scores.sum(axis=0)
+        self._score_sq_sum += sign * (scores ** 2).sum(axis=0)
+
+    @property
+    def weights(self):
+        return self._weights[:self.count]
+
+    @property
+    def scores(self):
+        """Array (utenti, fattori, alternative) degli invii aggregati."""
+        return self._scores[:self.count]
+
+    @property
+    def totals(self):
+        return self._totals[:self.count]
+
+    def mean_totals(self):
+        return self.total_sum / self.count
+
+    def median_totals(self):
+        return np.median(self.totals, axis=0)
+
+    def borda_ranking(self):
+        return np.argsort(-self.borda_points, kind="stable")
+
+    def kemeny_ranking(self):
+        """Classifica che massimizza le preferenze a coppie rispettate.
+
+        Esatta fino a ``KEMENY_EXACT_MAX`` alternative, altrimenti parte dalla classifica
+        di Borda e scambia alternative adiacenti finché l'accordo migliora.
+        """
+        n_alternatives = len(self.alternatives)
+        if n_alternatives <= KEMENY_EXACT_MAX:
+            orders = np.array(list(itertools.permutations(range(n_alternatives))), dtype=np.intp)
+            positions = np.argsort(orders, axis=1)
+            before = positions[:, :, np.newaxis] < positions[:, np.newaxis, :]
+            agreement = (before * self.pairwise).sum(axis=(1, 2))
+            return orders[np.argmax(agreement)]
+
+        order = list(self.borda_ranking())
+        improved = True
+        while improved:
+            improved = False
+            for k in range(n_alternatives - 1):
+                first, second = order[k], order[k + 1]
+                if self.pairwise[second, first] > self.pairwise[first, second]:
+                    order[k], order[k + 1] = second, first
+                    improved = True
+        return np.array(order, dtype=np.intp)
+
+    def factor_dispersion(self):
+        """Deviazione standard tra i valutatori, per fattore: (dei pesi, media dei punteggi)."""
+        mean_weight = self._weight_sum / self.count
+        weight_std = np.sqrt(np.maximum(self._weight_sq_sum / self.count - mean_weight ** 2, 0))
+        mean_score = self._score_sum / self.count
+        score_std = np.sqrt(np.maximum(self._score_sq_sum / self.count - mean_score ** 2, 0))
+        return weight_std, score_std.mean(axis=1)
+
+
+class CatalogAggregates:
+    """Aggregati di tutti gli invii di un catalogo, raggruppati per (fattori, alternative).
+
+    ``update`` legge dall'archivio solo gli invii arrivati dopo l'ultimo aggiornamento.
+    Ogni valutatore conta una volta: un suo nuovo invio sostituisce negli aggregati
+    quello precedente, come nell'archivio.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.groups = {}
+        self.last_id = 0
+        self._raters = {}  # valutatore -> chiave del gruppo con il suo invio
+        self._lock = threading.Lock()
+
+    def update(self, store):
+        with self._lock:
+            batches = {}
+            for submission in store.submissions(self.catalog, after_id=self.last_id):
+                key = (submission.factors, submission.alternatives)
+                previous = self._raters.get(submission.rater) if submission.rater else None
+                if previous is not None:
+                    group = self.groups[previous]
+                    group.remove(submission.rater)
+                    if not group.count:
+                        del self.groups[previous]
+                if submission.rater:
+                    self._raters[submission.rater] = key
+                batches.setdefault(key, []).append(submission)
+                self.last_id = submission.id
+            for key, submissions in batches.items():
+                if key not in self.groups:
+                    self.groups[key] = GroupAggregate(*key)
+                self.groups[key].add_many(np.stack([s.weights for s in submissions]),
+                                          np.stack([s.scores for s in submissions]),
+                                          [s.rater for s in submissions])
+            return self.groups
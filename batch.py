@@ -0,0 +1,230 @@
+"""Ricalcolo in blocco di molte Decision Matrix, senza Streamlit.
+
+Il file di ingresso (CSV o Parquet) ha una riga per ogni fattore di ogni matrice,
+con lo stesso layout della matrice mostrata da ``sceltacasa.main()``::
+
+    matrix_id,Fattore,Peso,Strategia A,Strategia B,Strategia C
+    teo,Costo della soluzione,7,3,8,5
+    teo,Rischio,4,6,2,9
+    ...
+
+Le righe di una stessa matrice devono essere contigue. Il file viene letto a blocchi,
+ogni blocco di matrici complete viene impilato in un array (M, F, A) e valutato con
+uno dei motori di ``engines.py`` (per default la somma ponderata); la classifica
+viene scritta in CSV o Parquet, una riga per (matrice, alternativa).
+
+Un file ottenuto unendo gli export CSV di più persone ha le colonne di tutte le
+alternative: le celle vuote indicano le alternative che una matrice non ha, che
+restano fuori dalla sua classifica.
+
+Esempio::
+
+    python batch.py risposte_q3.parquet -o classifiche_q3.csv --chunksize 200000
+    python batch.py risposte_q3.csv -o topsis_q3.parquet --engine topsis --catalog lampade
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from catalog import get_catalog
+from engines import BENEFIT, ENGINES, get_engine
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+def read_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Legge il file a blocchi di al massimo ``chunksize`` righe."""
+    if Path(path).suffix.lower() == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Per leggere file Parquet serve il pacchetto 'pyarrow'.")
+        parquet_file = pq.ParquetFile(path)
+        for record_batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield record_batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def iter_matrix_blocks(chunks, id_column="matrix_id"):
+    """Riallinea i blocchi letti in modo che nessuna matrice resti spezzata tra due blocchi."""
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+        if chunk.empty:
+            continue
+        ids = chunk[id_column].to_numpy()
+        # L'ultima matrice del blocco potrebbe continuare nel blocco successivo
+        boundaries = np.flatnonzero(ids[1:] != ids[:-1])
+        last_start = boundaries[-1] + 1 if len(boundaries) else 0
+        pending = chunk.iloc[last_start:]
+        if last_start:
+            yield chunk.iloc[:last_start]
+    if pending is not None and not pending.empty:
+        yield pending
+
+
+def stack_block(block, alternatives, id_column="matrix_id", weight_column="Peso",
+                factor_column="Fattore", directions=None):
+    """Impila un blocco di matrici complete in pesi (M, F), punteggi (M, F, A),
+    direzioni dei fattori (M, F), ricavate da ``directions`` (nome fattore -> direzione),
+    e alternative presenti in ogni matrice (M, A).
+
+    Le matrici con meno fattori vengono completate con righe a peso 0. Un'alternativa
+    è assente da una matrice se non ha punteggi in nessuna delle sue righe; se ne ha
+    solo in alcune viene sollevato ``ValueError``.
+    """
+    ids = block[id_column].to_numpy()
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    lengths = np.diff(np.r_[starts, len(ids)])
+    matrix_index = np.repeat(np.arange(len(starts)), lengths)
+    factor_index = np.arange(len(ids)) - np.repeat(starts, lengths)
+
+    weights = np.zeros((len(starts), lengths.max()), dtype=np.float64)
+    scores = np.zeros((len(starts), lengths.max(), len(alternatives)), dtype=np.float64)
+    weights[matrix_index, factor_index] = block[weight_column].to_numpy(dtype=np.float64)
+    scores[matrix_index, factor_index] = block[alternatives].to_numpy(dtype=np.float64)
+    missing = np.isnan(scores)
+    real = np.arange(weights.shape[1]) < lengths[:, np.newaxis]
+    present = ~(missing | ~real[:, :, np.newaxis]).all(axis=1)
+    incomplete = missing.any(axis=1) & present
+    if incomplete.any():
+        m, a = np.argwhere(incomplete)[0]
+        raise ValueError(f"Matrice {ids[starts][m]!r}: punteggi mancanti per '{alternatives[a]}' "
+                         "in alcuni fattori")
+    if not present.any(axis=1).all():
+        m = np.flatnonzero(~present.any(axis=1))[0]
+        raise ValueError(f"Matrice {ids[starts][m]!r}: nessuna alternativa con dei punteggi")
+    scores[missing] = 0
+    factor_directions = np.full(weights.shape, BENEFIT)
+    if directions:
+        factor_directions[matrix_index, factor_index] = [
+            directions.get(factor, BENEFIT) for factor in block[factor_column]]
+    return ids[starts], weights, scores, factor_directions, present
+
+
+def rank_block(matrix_ids, weights, scores, alternatives, engine="weighted_sum", directions=None,
+               present=None):
+    """Valuta un blocco con il motore indicato e restituisce la classifica in formato lungo.
+
+    ``present`` (M, A) indica le alternative di ogni matrice: le matrici con le stesse
+    alternative vengono valutate insieme, solo su quelle colonne.
+    """
+    alternatives = np.asarray(alternatives, dtype=object)
+    if present is None or present.all():
+        groups = [(np.arange(len(matrix_ids)), np.arange(len(alternatives)))]
+    else:
+        patterns, inverse = np.unique(present, axis=0, return_inverse=True)
+        groups = [(np.flatnonzero(inverse.ravel() == k), np.flatnonzero(pattern))
+                  for k, pattern in enumerate(patterns)]
+    if directions is not None:
+        directions = np.broadcast_to(directions, weights.shape)
+
+    frames = []
+    for rows, columns in groups:
+        result = get_engine(engine).rank(weights[rows], scores[rows][:, :, columns],
+                                         None if directions is None else directions[rows])
+        n_alternatives = len(columns)
+        frames.append(pd.DataFrame({
+            "matrix_id": np.repeat(matrix_ids[rows], n_alternatives),
+            "Posizione": np.tile(np.arange(1, n_alternatives + 1), len(rows)),
+            "Strategia": alternatives[columns][result.ranking].ravel(),
+            "Punteggio": np.take_along_axis(result.totals, result.ranking, axis=1).ravel(),
+            "_ordine": np.repeat(rows, n_alternatives),
+        }))
+    if len(frames) == 1:
+        return frames[0].drop(columns="_ordine")
+    # Le matrici restano nell'ordine del file anche se valutate a gruppi
+    frame = pd.concat(frames, ignore_index=True).sort_values(["_ordine", "Posizione"], kind="stable",
+                                                             ignore_index=True)
+    return frame.drop(columns="_ordine")
+
+
+class RankingWriter:
+    """Scrive la classifica un blocco alla volta, in CSV o Parquet a seconda dell'estensione."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.parquet = self.path.suffix.lower() == ".parquet"
+        self._writer = None
+        self._header = True
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode="w" if self._header else "a",
+                         header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def run(input_path, output_path, chunksize=DEFAULT_CHUNKSIZE, id_column="matrix_id",
+        factor_column="Fattore", weight_column="Peso", engine="weighted_sum", catalog=None):
+    """Ricalcola tutte le matrici di ``input_path`` e restituisce (righe lette, matrici, secondi).
+
+    Con ``catalog`` le direzioni (beneficio/costo) dei fattori vengono prese dal catalogo.
+    """
+    started = time.perf_counter()
+    directions = None
+    if catalog is not None:
+        catalog = get_catalog(catalog)
+        directions = dict(zip(catalog.factor_names, catalog.directions))
+    rows = matrices = 0
+    alternatives = None
+    writer = RankingWriter(output_path)
+    try:
+        chunks = read_chunks(input_path, chunksize)
+        for block in iter_matrix_blocks(chunks, id_column):
+            if alternatives is None:
+                fixed = {id_column, factor_column, weight_column}
+                alternatives = [col for col in block.columns if col not in fixed]
+                if not alternatives:
+                    raise ValueError("Il file non contiene colonne di alternative da valutare.")
+            matrix_ids, weights, scores, factor_directions, present = stack_block(
+                block, alternatives, id_column, weight_column, factor_column, directions)
+            writer.write(rank_block(matrix_ids, weights, scores, alternatives, engine,
+                                    factor_directions, present))
+            rows += len(block)
+            matrices += len(matrix_ids)
+    finally:
+        writer.close()
+    return rows, matrices, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ricalcola in blocco le classifiche di molte Decision Matrix.")
+    parser.add_argument("input", help="File CSV o Parquet con una riga per fattore di ogni matrice")
+    parser.add_argument("-o", "--output", required=True, help="File di uscita (.csv o .parquet)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="Righe lette per blocco (limita la memoria usata)")
+    parser.add_argument("--id-column", default="matrix_id")
+    parser.add_argument("--factor-column", default="Fattore")
+    parser.add_argument("--weight-column", default="Peso")
+    parser.add_argument("--engine", choices=list(ENGINES), default="weighted_sum",
+                        help="Metodo di aggregazione (vedi engines.py)")
+    parser.add_argument("--catalog", help="Catalogo da cui leggere quali fattori sono costi")
+    args = parser.parse_args(argv)
+
+    rows, matrices, elapsed = run(args.input, args.output, args.chunksize,
+                                  args.id_column, args.factor_column, args.weight_column,
+                                  args.engine, args.catalog)
+    rate = rows / elapsed if elapsed else float("inf")
+    print(f"{matrices} matrici ({rows} righe) in {elapsed:.2f}s - {rate:,.0f} righe/s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
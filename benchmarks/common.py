@@ -0,0 +1,67 @@
+"""Funzioni condivise dai benchmark: misura dei tempi e salvataggio dei risultati.
+
+Ogni modulo di benchmark espone ``KEY`` (il campo che identifica un caso),
+``METRICS`` (i campi confrontati da ``suite.py``, per cui più basso è meglio) e
+``run(quick=False)``, che restituisce una lista di dizionari.
+"""
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_PATH = ROOT / "sceltacasa.py"
+
+# I moduli dell'app stanno nella radice del repository
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def time_call(function, repeat=5, min_time=0.2, max_repeat=1000):
+    """Esegue ``function()`` almeno ``repeat`` volte (e per almeno ``min_time`` secondi,
+    senza superare ``max_repeat`` esecuzioni) e restituisce mediana e minimo in ms."""
+    timings = []
+    spent = 0.0
+    while len(timings) < repeat or (spent < min_time and len(timings) < max_repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        timings.append(elapsed)
+        spent += elapsed
+    return round(statistics.median(timings) * 1000, 4), round(min(timings) * 1000, 4)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def environment():
+    """Dati sulla macchina e sulla versione del codice, salvati insieme ai risultati."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import numpy
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def dump(results, output=None):
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if output:
+        Path(output).write_text(text, encoding="utf-8")
+    print(text)
@@ -0,0 +1,68 @@
+"""Misura tempo e dimensione del file Excel esportato al variare della matrice.
+
+Ogni misura usa un nome utente diverso, quindi salta la cache di ``export.py``;
+a parte viene misurato anche il costo di una richiesta già in cache. openpyxl viene
+misurato solo fino a ``OPENPYXL_MAX_CELLS`` celle, oltre diventa troppo lento.
+
+    python benchmarks/excel_export.py --output export.json
+"""
+import argparse
+import importlib.util
+import itertools
+
+from common import dump, time_call
+from matrix_scoring import random_matrix
+
+from export import build_export
+
+KEY = "case"
+METRICS = ("ms_median", "bytes")
+
+# (alternative, fattori)
+SIZES = ((3, 13), (20, 50), (50, 200), (100, 1000), (500, 5000))
+QUICK_SIZES = SIZES[:3]
+OPENPYXL_MAX_CELLS = 200_000
+
+
+def run(quick=False):
+    engines = [engine for engine in ("xlsxwriter", "openpyxl") if importlib.util.find_spec(engine)]
+    results = []
+    for n_alternatives, n_factors in QUICK_SIZES if quick else SIZES:
+        weights, scores = random_matrix(n_alternatives, n_factors)
+        factors = [f"Fattore {i}" for i in range(n_factors)]
+        alternatives = [f"Alternativa {j}" for j in range(n_alternatives)]
+        for engine in engines:
+            if engine == "openpyxl" and n_alternatives * n_factors > OPENPYXL_MAX_CELLS:
+                continue
+            users = (f"Benchmark {i}" for i in itertools.count())
+
+            def export(user=None):
+                return build_export(user or next(users), factors, alternatives, weights, scores,
+                                    fmt="xlsx", engine=engine)
+
+            large = n_alternatives * n_factors > 10_000
+            median, best = time_call(export, repeat=3 if large else 5, min_time=0 if large else 0.2)
+            payload = export("Benchmark cache")
+            cached, _ = time_call(lambda: export("Benchmark cache"))
+            results.append({
+                "case": f"{engine} {n_alternatives}x{n_factors}",
+                "alternatives": n_alternatives,
+                "factors": n_factors,
+                "bytes": len(payload),
+                "ms_median": median,
+                "ms_min": best,
+                "cached_ms": cached,
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Solo le dimensioni più piccole")
+    parser.add_argument("--output", help="Salva i risultati in questo file JSON")
+    args = parser.parse_args(argv)
+    dump(run(args.quick), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Test di carico: molte sessioni contemporanee contro un vero server Streamlit locale.
+
+Avvia ``streamlit run sceltacasa.py`` in una cartella temporanea (con outbox e archivio
+propri) e un finto server Telegram che risponde subito ``ok`` a ``sendDocument``.
+Ogni sessione si collega al websocket di Streamlit come farebbe il browser, inserisce
+il nome, preme "Inizia" e poi "MOSTRA I RISULTATI" ``--rounds`` volte. Vengono misurati
+i tempi di ogni rerun, il throughput complessivo e quanto tempo serve perché tutti i
+file accodati arrivino al finto Telegram.
+
+    python benchmarks/load.py --sessions 20 --rounds 3 --output load.json
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from common import APP_PATH, dump, percentile
+
+KEY = "case"
+METRICS = ("rerun_ms_median", "rerun_ms_p95", "results_ms_median", "results_ms_p95", "delivery_s")
+
+
+class TelegramStub(BaseHTTPRequestHandler):
+    """Finto Bot API: conta i documenti ricevuti e risponde sempre ``ok``."""
+    documents = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with TelegramStub.lock:
+            TelegramStub.documents += 1
+        body = b'{"ok": true, "result": {}}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workdir, api_url, port, timeout=60):
+    secrets = Path(workdir) / ".streamlit" / "secrets.toml"
+    secrets.parent.mkdir(parents=True, exist_ok=True)
+    secrets.write_text(f'[telegram]\nbot_token = "load-test"\nchat_id = "0"\napi_url = "{api_url}"\n',
+                       encoding="utf-8")
+    env = dict(os.environ,
+               DECISION_MATRIX_OUTBOX=str(Path(workdir) / "outbox.sqlite3"),
+               DECISION_MATRIX_STORE=str(Path(workdir) / "submissions.sqlite3"))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(APP_PATH), "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("Il server Streamlit è terminato durante l'avvio")
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Il server Streamlit non ha risposto in tempo")
+
+
+class Session:
+    """Una sessione del browser, ridotta ai messaggi del protocollo che servono."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.widgets = {}  # etichetta -> ID del widget dell'ultimo rerun
+        self.errors = 0
+
+    async def rerun(self, **states):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        for label, value in states.items():
+            widget = message.rerun_script.widget_states.widgets.add()
+            widget.id = self.widgets[label]
+            if value is True:
+                widget.trigger_value = True
+            else:
+                widget.string_value = value
+        started = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+        self.widgets = {}
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.websocket.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                field = element.WhichOneof("type")
+                if field == "exception":
+                    self.errors += 1
+                widget = getattr(element, field)
+                if getattr(widget, "id", "") and getattr(widget, "label", ""):
+                    self.widgets[widget.label] = widget.id
+            elif kind == "script_finished":
+                return time.perf_counter() - started
+
+
+async def user(port, index, rounds, reruns, results):
+    import websockets
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream",
+                                  subprotocols=["streamlit"], max_size=None) as websocket:
+        session = Session(websocket)
+        reruns.append(await session.rerun())
+        reruns.append(await session.rerun(**{"Inserisci il tuo nome (es. Teo):": f"Carico {index}",
+                                             "Inizia": True}))
+        for _ in range(rounds):
+            elapsed = await session.rerun(**{"MOSTRA I RISULTATI": True})
+            reruns.append(elapsed)
+            results.append(elapsed)
+        return session.errors
+
+
+async def load(port, sessions, rounds):
+    reruns, results = [], []
+    started = time.perf_counter()
+    errors = await asyncio.gather(*(user(port, i, rounds, reruns, results) for i in range(sessions)),
+                                  return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for error in errors if isinstance(error, BaseException))
+    exceptions = sum(error for error in errors if isinstance(error, int))
+    return reruns, results, elapsed, failed, exceptions
+
+
+def run(quick=False, sessions=20, rounds=3, delivery_timeout=120):
+    if quick:
+        sessions, rounds = 5, 1
+    TelegramStub.documents = 0
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), TelegramStub)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        process = start_server(workdir, f"http://127.0.0.1:{stub.server_address[1]}", port)
+        try:
+            reruns, results, elapsed, failed, exceptions = asyncio.run(load(port, sessions, rounds))
+            # Stessa sessione, stessi dati: l'outbox deduplica, quindi arriva un file per sessione
+            expected = sessions - failed
+            finished = time.perf_counter()
+            while TelegramStub.documents < expected and time.perf_counter() - finished < delivery_timeout:
+                time.sleep(0.05)
+            delivery = time.perf_counter() - finished
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+            stub.shutdown()
+    return [{
+        "case": f"{sessions} sessioni x {rounds} risultati",
+        "sessions": sessions,
+        "rounds": rounds,
+        "reruns": len(reruns),
+        "rerun_ms_median": round(statistics.median(reruns) * 1000, 2) if reruns else None,
+        "rerun_ms_p95": round(percentile(reruns, 0.95) * 1000, 2) if reruns else None,
+        "results_ms_median": round(statistics.median(results) * 1000, 2) if results else None,
+        "results_ms_p95": round(percentile(results, 0.95) * 1000, 2) if results else None,
+        "reruns_per_s": round(len(reruns) / elapsed, 2),
+        "failed_sessions": failed,
+        "script_exceptions": exceptions,
+        "documents_delivered": TelegramStub.documents,
+        "delivery_s": round(delivery, 3),
+    }]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20, help="Sessioni contemporanee")
+    parser.add_argument("--rounds", type=int, default=3, help="Pressioni di \"MOSTRA I RISULTATI\" per sessione")
+    parser.add_argument("--output", help="Salva i risultati in questo file JSON")
+    args = parser.parse_args(argv)
+    dump(run(sessions=args.sessions, rounds=args.rounds), args.output)
+
+
+if __name__ == "__main__":
+    main()
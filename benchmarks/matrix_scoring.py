@@ -0,0 +1,62 @@
+"""Misura il calcolo dei punteggi per matrici da 3 alternative x 13 fattori (la
+matrice delle lampade) fino a 500 alternative x 5000 fattori.
+
+Per ogni dimensione vengono misurati ``scoring.score_matrix`` (usato dalla UI, con
+contributi e classifica) e ogni motore di ``engines.py`` su una singola matrice.
+
+    python benchmarks/matrix_scoring.py --output scoring.json
+"""
+import argparse
+
+import numpy as np
+
+from common import dump, time_call
+
+from engines import ENGINES
+from scoring import score_matrix
+
+KEY = "case"
+METRICS = ("ms_median",)
+
+# (alternative, fattori)
+SIZES = ((3, 13), (10, 13), (20, 50), (50, 200), (100, 1000), (500, 5000))
+QUICK_SIZES = SIZES[:4]
+
+
+def random_matrix(n_alternatives, n_factors, seed=0):
+    rng = np.random.default_rng(seed)
+    weights = rng.integers(1, 11, n_factors)
+    scores = rng.integers(1, 11, (n_factors, n_alternatives))
+    return weights, scores
+
+
+def run(quick=False):
+    results = []
+    for n_alternatives, n_factors in QUICK_SIZES if quick else SIZES:
+        weights, scores = random_matrix(n_alternatives, n_factors)
+        directions = np.where(np.arange(n_factors) % 3 == 0, -1, 1)
+        cases = {"score_matrix": lambda: score_matrix(weights, scores)}
+        for name, engine in ENGINES.items():
+            cases[name] = lambda engine=engine: engine.rank(weights, scores, directions)
+        for name, function in cases.items():
+            median, best = time_call(function)
+            results.append({
+                "case": f"{name} {n_alternatives}x{n_factors}",
+                "alternatives": n_alternatives,
+                "factors": n_factors,
+                "ms_median": median,
+                "ms_min": best,
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Solo le dimensioni più piccole")
+    parser.add_argument("--output", help="Salva i risultati in questo file JSON")
+    args = parser.parse_args(argv)
+    dump(run(args.quick), args.output)
+
+
+if __name__ == "__main__":
+    main()
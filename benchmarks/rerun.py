@@ -0,0 +1,128 @@
+"""Misura il costo di un rerun dello script Streamlit per ogni metodo di valutazione.
+
+Usa ``streamlit.testing.v1.AppTest`` per eseguire ``sceltacasa.py`` senza browser:
+per i metodi a slider ogni rerun è provocato dallo spostamento di uno slider,
+per la tabella dalla modifica di un peso seguita dalla conferma del form. Oltre al tempo di un rerun viene stimato
+il costo per compilare l'intera matrice (un rerun per slider contro uno solo per
+la tabella).
+
+    python benchmarks/rerun.py --repeat 20
+"""
+import argparse
+import json
+import statistics
+import time
+
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.element_tree import Dataframe, Widget
+
+from common import APP_PATH, dump
+
+KEY = "method"
+METRICS = ("rerun_ms_median", "fill_matrix_ms")
+
+
+def start_app(method_index):
+    at = AppTest.from_file(str(APP_PATH), default_timeout=120)
+    # Nessun invio reale: il rerun misurato non preme mai "MOSTRA I RISULTATI"
+    at.secrets["telegram"] = {"bot_token": "benchmark", "chat_id": "0", "api_url": "http://127.0.0.1:9"}
+    at.run()
+    at.text_input[0].input("Benchmark")
+    at.button[0].click()
+    at.run()
+    radio = at.radio[0]
+    radio.set_value(radio.options[method_index])
+    at.run()
+    return at, radio.options[method_index]
+
+
+class EditedTable(Widget):
+    """La tabella del form con delle celle modificate.
+
+    AppTest mostra ``st.data_editor`` come un semplice dataframe, senza modo di modificarlo:
+    questo nodo prende il suo posto nell'albero e al rerun invia le modifiche nello stesso
+    formato JSON del browser.
+    """
+
+    def __init__(self, element, edited_rows):
+        self.proto = element.proto
+        self.root = element.root
+        self.type = "data_editor"
+        self.id = element.proto.id
+        self.key = element.key
+        self.disabled = False
+        self._value = edited_rows
+
+    @property
+    def value(self):
+        return self._value
+
+    @property
+    def _widget_state(self):
+        state = WidgetState()
+        state.id = self.id
+        state.string_value = json.dumps({"edited_rows": self._value, "added_rows": [], "deleted_rows": []})
+        return state
+
+
+def edit_table(block, edited_rows):
+    """Sostituisce la tabella dei punteggi in ``block`` con un ``EditedTable``."""
+    for index, child in block.children.items():
+        if isinstance(child, Dataframe) and child.key and "_grid_" in child.key:
+            block.children[index] = EditedTable(child, edited_rows)
+            return True
+        if getattr(child, "children", None) and edit_table(child, edited_rows):
+            return True
+    return False
+
+
+def measure(method_index, repeat):
+    at, method = start_app(method_index)
+    sliders = len(at.slider)
+    timings = []
+    edited_rows = {}
+    for i in range(repeat):
+        if sliders:
+            slider = at.slider[i % sliders]
+            slider.set_value(2 if slider.value != 2 else 3)
+        else:
+            # Come nel browser: si cambia un peso nella tabella e si conferma il form
+            # (il browser invia ogni volta tutte le modifiche fatte finora)
+            row = str(i % len(at.session_state.matrix.weights))
+            edited_rows[row] = {"Peso": 2 if edited_rows.get(row, {}).get("Peso") != 2 else 3}
+            if not edit_table(at.main, edited_rows):
+                raise RuntimeError("Tabella dei punteggi non trovata")
+            next(button for button in at.button if button.label == "Conferma i valori").click()
+        started = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - started)
+        if not sliders and at.session_state.matrix.weights[int(row)] != edited_rows[row]["Peso"]:
+            raise RuntimeError("La modifica della tabella non è stata applicata")
+    rerun_ms = statistics.median(timings) * 1000
+    reruns_to_fill = sliders if sliders else 1
+    return {
+        "method": method,
+        "sliders": sliders,
+        "rerun_ms_median": round(rerun_ms, 2),
+        "rerun_ms_max": round(max(timings) * 1000, 2),
+        "reruns_to_fill_matrix": reruns_to_fill,
+        "fill_matrix_ms": round(rerun_ms * reruns_to_fill, 2),
+    }
+
+
+def run(quick=False, repeat=10):
+    probe, _ = start_app(0)
+    return [measure(index, 3 if quick else repeat) for index in range(len(probe.radio[0].options))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="Rerun misurati per ogni metodo")
+    parser.add_argument("--output", help="Salva i risultati in questo file JSON")
+    args = parser.parse_args(argv)
+    dump(run(repeat=args.repeat), args.output)
+
+
+if __name__ == "__main__":
+    main()
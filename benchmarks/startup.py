@@ -0,0 +1,122 @@
+"""Misura il costo di avvio dell'app: import dei moduli e primo rerun, in processi nuovi.
+
+Per ogni misura parte un nuovo interprete, come una replica appena avviata:
+
+* ``import_ms``: tempo per importare ``sceltacasa`` dopo ``streamlit`` (quindi il
+  costo delle dipendenze dell'app, non di Streamlit stesso), con l'elenco delle
+  dipendenze pesanti caricate all'avvio;
+* ``first_run_ms``: primo rerun della schermata iniziale con ``AppTest``, import compresi;
+* ``top_imports``: gli import diretti più costosi secondo ``python -X importtime``.
+
+Con ``--rev`` la stessa misura viene ripetuta su un'altra revisione git (estratta in una
+cartella temporanea), per confrontare il prima e il dopo di una modifica::
+
+    python benchmarks/startup.py --rev HEAD~1 --repeat 10
+"""
+import argparse
+import io
+import json
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+
+from common import ROOT, dump
+
+KEY = "case"
+METRICS = ("import_ms_median", "first_run_ms_median")
+
+HEAVY_MODULES = ("numpy", "pandas", "pyarrow", "requests", "openpyxl", "xlsxwriter", "pyinstrument")
+
+IMPORT_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+import streamlit
+before = set(sys.modules)
+started = time.perf_counter()
+import sceltacasa
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed,
+                  "modules": [m for m in {heavy!r} if m in sys.modules and m not in before]}}))
+"""
+
+FIRST_RUN_PROBE = """
+import json, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+started = time.perf_counter()
+at.run()
+print(json.dumps({{"seconds": time.perf_counter() - started}}))
+"""
+
+
+def probe(code, cwd):
+    output = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def top_imports(root, count=10):
+    """Import diretti di ``sceltacasa`` ordinati per tempo cumulativo (ms)."""
+    code = f"import sys; sys.path.insert(0, {str(root)!r}); import streamlit; import sceltacasa"
+    report = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=root,
+                            capture_output=True, text=True, check=True).stderr
+    imports, after_streamlit = [], False
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.strip() == "streamlit" and not name.startswith("  "):
+            after_streamlit = True
+        elif after_streamlit and cumulative.strip().isdigit() and name.startswith("   ") \
+                and not name.startswith("    "):
+            imports.append((name.strip(), round(int(cumulative) / 1000, 2)))
+    return sorted(imports, key=lambda item: -item[1])[:count]
+
+
+def measure(root, case, repeat):
+    imports = [probe(IMPORT_PROBE.format(root=str(root), heavy=HEAVY_MODULES), root) for _ in range(repeat)]
+    first_runs = [probe(FIRST_RUN_PROBE.format(app=str(root / "sceltacasa.py")), root)["seconds"]
+                  for _ in range(repeat)]
+    seconds = [result["seconds"] for result in imports]
+    return {
+        "case": case,
+        "import_ms_median": round(statistics.median(seconds) * 1000, 2),
+        "import_ms_min": round(min(seconds) * 1000, 2),
+        "first_run_ms_median": round(statistics.median(first_runs) * 1000, 2),
+        "heavy_modules_at_startup": imports[0]["modules"],
+        "top_imports": top_imports(root),
+    }
+
+
+def checkout(rev, directory):
+    """Estrae i file della revisione ``rev`` in ``directory``."""
+    archive = subprocess.run(["git", "archive", "--format=tar", rev], cwd=ROOT,
+                             capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(directory)
+    return Path(directory)
+
+
+def run(quick=False, repeat=5, rev=None):
+    repeat = 2 if quick else repeat
+    results = [measure(ROOT, "app", repeat)]
+    if rev:
+        with tempfile.TemporaryDirectory() as directory:
+            results.append(measure(checkout(rev, directory), f"app@{rev}", repeat))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Processi avviati per ogni misura")
+    parser.add_argument("--rev", help="Misura anche questa revisione git (es. HEAD~1) per confronto")
+    parser.add_argument("--output", help="Salva i risultati in questo file JSON")
+    args = parser.parse_args(argv)
+    dump(run(repeat=args.repeat, rev=args.rev), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Esegue i benchmark, salva i risultati in JSON e li confronta con una esecuzione precedente.
+
+Benchmark disponibili: ``scoring`` (matrix_scoring.py), ``export`` (excel_export.py),
+``rerun`` (rerun.py, con AppTest), ``load`` (load.py, server locale e finto Telegram)
+e ``startup`` (startup.py, import e primo rerun in processi nuovi).
+
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --only scoring export --baseline baseline.json --threshold 0.2
+    python benchmarks/suite.py --results nuovi.json --baseline baseline.json
+
+Nel confronto una metrica peggiora se supera il valore di riferimento di oltre la
+soglia relativa (e di oltre ``--min-delta`` in valore assoluto, per non segnalare
+il rumore sulle misure di pochi microsecondi). Se ci sono peggioramenti il comando
+termina con codice 1, quindi può essere usato in CI.
+"""
+import argparse
+import importlib
+import json
+import sys
+from pathlib import Path
+
+from common import dump, environment
+
+BENCHMARKS = {
+    "scoring": "matrix_scoring",
+    "export": "excel_export",
+    "rerun": "rerun",
+    "load": "load",
+    "startup": "startup",
+}
+
+
+def run(names, quick=False):
+    results = {"environment": environment(), "benchmarks": {}}
+    for name in names:
+        print(f"Benchmark {name}...", file=sys.stderr)
+        module = importlib.import_module(BENCHMARKS[name])
+        results["benchmarks"][name] = module.run(quick=quick)
+    return results
+
+
+def compare(baseline, current, threshold=0.1, min_delta=0.1):
+    """Confronta due risultati di ``run`` e restituisce l'elenco delle differenze per metrica."""
+    rows = []
+    for name, records in current["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        module = importlib.import_module(BENCHMARKS[name])
+        reference = {record[module.KEY]: record for record in baseline["benchmarks"][name]}
+        for record in records:
+            old = reference.get(record[module.KEY])
+            if old is None:
+                continue
+            for metric in module.METRICS:
+                before, after = old.get(metric), record.get(metric)
+                if before is None or after is None:
+                    continue
+                change = (after - before) / before if before else 0.0
+                rows.append({
+                    "benchmark": name,
+                    "case": record[module.KEY],
+                    "metric": metric,
+                    "before": before,
+                    "after": after,
+                    "change": change,
+                    "regression": change > threshold and after - before > min_delta,
+                })
+    return rows
+
+
+def print_comparison(rows, threshold):
+    regressions = [row for row in rows if row["regression"]]
+    for row in rows:
+        marker = "PEGGIORATO" if row["regression"] else ""
+        print(f"{row['benchmark']:<8} {row['case']:<45} {row['metric']:<18} "
+              f"{row['before']:>12} -> {row['after']:>12} {row['change']:>+8.1%} {marker}")
+    print(f"\n{len(regressions)} peggioramenti oltre il {threshold:.0%} su {len(rows)} metriche confrontate.")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help="Benchmark da eseguire (predefinito: tutti)")
+    parser.add_argument("--quick", action="store_true", help="Casi ridotti, per un controllo veloce")
+    parser.add_argument("--output", help="Salva i risultati in questo file JSON")
+    parser.add_argument("--results", help="Non eseguire nulla: confronta questo file di risultati")
+    parser.add_argument("--baseline", help="Risultati di riferimento con cui confrontare")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Peggioramento relativo tollerato (0.1 = 10%%)")
+    parser.add_argument("--min-delta", type=float, default=0.1,
+                        help="Differenza assoluta minima per segnalare un peggioramento")
+    args = parser.parse_args(argv)
+
+    if args.results:
+        results = json.loads(Path(args.results).read_text(encoding="utf-8"))
+    else:
+        results = run(args.only, args.quick)
+        if args.output or not args.baseline:
+            dump(results, args.output)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = print_comparison(compare(baseline, results, args.threshold, args.min_delta),
+                                       args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
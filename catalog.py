@@ -0,0 +1,132 @@
+"""Cataloghi di fattori caricati da file JSON (o YAML, se PyYAML è installato).
+
+Ogni file della cartella ``catalogs/`` descrive un dominio di decisione: titolo,
+istruzioni, come si chiamano le alternative, quelle proposte all'inizio e l'elenco
+dei fattori con spiegazione ed eventuale suggerimento per la valutazione::
+
+    {
+      "name": "Strategia di test delle lampade",
+      "title": "Decision Matrix per la strategia di test delle lampade",
+      "instructions": "Istruzioni: assegna un peso (1-10) a ciascun fattore e poi valuta le strategie.",
+      "alternative": "strategia",
+      "alternatives": "strategie",
+      "default_alternatives": ["Subito test con pochi follower", "..."],
+      "factors": [
+        {"name": "Rischio", "explanation": "Il grado di incertezza ...", "hint": "", "direction": "cost"}
+      ]
+    }
+
+``direction`` è ``"benefit"`` (predefinito: un punteggio alto è un vantaggio) oppure
+``"cost"`` (un punteggio alto è uno svantaggio); la usano i metodi di ``engines.py``.
+
+I file vengono letti solo quando servono e restano in memoria per tutta la vita del
+processo; se un file viene modificato su disco (mtime diverso) viene riletto.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import NamedTuple, Tuple
+
+from engines import BENEFIT, COST
+
+CATALOG_DIR = Path(os.environ.get("DECISION_MATRIX_CATALOGS", Path(__file__).resolve().parent / "catalogs"))
+DEFAULT_CATALOG = "lampade"
+SUFFIXES = (".json", ".yaml", ".yml")
+DIRECTIONS = {"benefit": BENEFIT, "cost": COST}
+
+
+class Factor(NamedTuple):
+    name: str
+    explanation: str = ""
+    hint: str = ""  # testo aggiunto alla richiesta di punteggio, es. cosa considerare
+    direction: str = "benefit"
+
+
+class Catalog(NamedTuple):
+    id: str
+    name: str
+    title: str
+    instructions: str
+    alternative: str
+    alternatives: str
+    default_alternatives: Tuple[str, ...]
+    factors: Tuple[Factor, ...]
+
+    @property
+    def factor_names(self):
+        return [factor.name for factor in self.factors]
+
+    @property
+    def explanations(self):
+        return {factor.name: factor.explanation for factor in self.factors}
+
+    @property
+    def directions(self):
+        return [DIRECTIONS[factor.direction] for factor in self.factors]
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _parse(path):
+    text = Path(path).read_text(encoding="utf-8")
+    if Path(path).suffix.lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError(f"Per leggere il catalogo {path} serve il pacchetto 'PyYAML'.")
+        raw = yaml.safe_load(text)
+    else:
+        raw = json.loads(text)
+
+    try:
+        factors = tuple(Factor(**factor) for factor in raw["factors"])
+        catalog = Catalog(
+            id=Path(path).stem,
+            name=raw.get("name", Path(path).stem),
+            title=raw["title"],
+            instructions=raw.get("instructions", ""),
+            alternative=raw.get("alternative", "alternativa"),
+            alternatives=raw.get("alternatives", "alternative"),
+            default_alternatives=tuple(raw.get("default_alternatives", ())),
+            factors=factors,
+        )
+    except (KeyError, TypeError) as exc:
+        raise ValueError(f"Catalogo {path} non valido: {exc}") from exc
+    if not factors:
+        raise ValueError(f"Catalogo {path} non valido: nessun fattore")
+    unknown = {factor.direction for factor in factors} - set(DIRECTIONS)
+    if unknown:
+        raise ValueError(f"Catalogo {path} non valido: direzioni sconosciute {sorted(unknown)}")
+    if len(set(catalog.factor_names)) != len(factors):
+        raise ValueError(f"Catalogo {path} non valido: fattori ripetuti")
+    return catalog
+
+
+def load_catalog(path):
+    """Restituisce il catalogo di ``path``, rileggendo il file solo se è cambiato."""
+    path = Path(path)
+    mtime = path.stat().st_mtime_ns
+    with _cache_lock:
+        cached = _cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    catalog = _parse(path)
+    with _cache_lock:
+        _cache[path] = (mtime, catalog)
+    return catalog
+
+
+def catalog_paths(directory=CATALOG_DIR):
+    """Mappa id del catalogo -> file, senza leggerne il contenuto."""
+    return {path.stem: path for path in sorted(Path(directory).iterdir())
+            if path.suffix.lower() in SUFFIXES}
+
+
+def get_catalog(catalog_id, directory=CATALOG_DIR):
+    paths = catalog_paths(directory)
+    if catalog_id not in paths:
+        raise KeyError(f"Catalogo sconosciuto: {catalog_id!r}")
+    return load_catalog(paths[catalog_id])
@@ -0,0 +1,145 @@
+"""Modello dati compatto della Decision Matrix.
+
+Pesi e punteggi sono array NumPy ``int8`` (i valori vanno da 1 a 10): i pesi hanno
+una voce per fattore, i punteggi sono una matrice fattori x alternative. Fattori e
+alternative hanno ID interi stabili, indipendenti dal nome e dalla posizione, così
+due alternative con lo stesso nome (o senza nome) non si sovrascrivono i punteggi
+e i widget possono usare l'ID come chiave anche dopo un'aggiunta o una rimozione.
+"""
+from collections import Counter
+
+import numpy as np
+
+MIN_VALUE = 1
+MAX_VALUE = 10
+
+
+def _check_value(value):
+    value = int(value)
+    if not MIN_VALUE <= value <= MAX_VALUE:
+        raise ValueError(f"I valori devono essere compresi tra {MIN_VALUE} e {MAX_VALUE}, non {value}")
+    return value
+
+
+class DecisionMatrix:
+    __slots__ = ("weights", "scores", "factor_ids", "alternative_ids",
+                 "_factor_names", "_alternative_names", "_next_factor_id", "_next_alternative_id")
+
+    def __init__(self, factors=(), alternatives=(), default=MIN_VALUE):
+        default = _check_value(default)
+        factors = list(factors)
+        alternatives = list(alternatives)
+        # ID progressivi separati per fattori e alternative, a partire da 1; non vengono mai riusati
+        self._next_factor_id = len(factors) + 1
+        self._next_alternative_id = len(alternatives) + 1
+        self.factor_ids = np.arange(1, len(factors) + 1, dtype=np.int64)
+        self.alternative_ids = np.arange(1, len(alternatives) + 1, dtype=np.int64)
+        self._factor_names = factors
+        self._alternative_names = alternatives
+        self.weights = np.full(len(factors), default, dtype=np.int8)
+        self.scores = np.full((len(factors), len(alternatives)), default, dtype=np.int8)
+
+    def __repr__(self):
+        return f"DecisionMatrix({len(self.factor_ids)} fattori x {len(self.alternative_ids)} alternative)"
+
+    @property
+    def shape(self):
+        return self.scores.shape
+
+    @property
+    def factor_names(self):
+        return list(self._factor_names)
+
+    @property
+    def alternative_names(self):
+        return list(self._alternative_names)
+
+    def factor_index(self, factor_id):
+        return self._position(self.factor_ids, factor_id, "Nessun fattore")
+
+    def alternative_index(self, alternative_id):
+        return self._position(self.alternative_ids, alternative_id, "Nessuna alternativa")
+
+    @staticmethod
+    def _position(ids, item_id, missing):
+        found = np.flatnonzero(ids == item_id)
+        if not len(found):
+            raise KeyError(f"{missing} con ID {item_id}")
+        return int(found[0])
+
+    # Modifica della struttura
+
+    def add_factor(self, name, weight=MIN_VALUE, scores=None):
+        """Aggiunge un fattore in fondo e ne restituisce l'ID."""
+        row = np.full(len(self.alternative_ids), MIN_VALUE, dtype=np.int8)
+        if scores is not None:
+            row[:] = [_check_value(score) for score in scores]
+        factor_id = self._next_factor_id
+        self._next_factor_id += 1
+        self.factor_ids = np.append(self.factor_ids, factor_id)
+        self._factor_names.append(name)
+        self.weights = np.append(self.weights, np.int8(_check_value(weight)))
+        self.scores = np.vstack([self.scores, row[np.newaxis, :]])
+        return factor_id
+
+    def add_alternative(self, name="", scores=None):
+        """Aggiunge un'alternativa in fondo e ne restituisce l'ID."""
+        column = np.full(len(self.factor_ids), MIN_VALUE, dtype=np.int8)
+        if scores is not None:
+            column[:] = [_check_value(score) for score in scores]
+        alternative_id = self._next_alternative_id
+        self._next_alternative_id += 1
+        self.alternative_ids = np.append(self.alternative_ids, alternative_id)
+        self._alternative_names.append(name)
+        self.scores = np.hstack([self.scores, column[:, np.newaxis]])
+        return alternative_id
+
+    def remove_factor(self, factor_id):
+        index = self.factor_index(factor_id)
+        self.factor_ids = np.delete(self.factor_ids, index)
+        del self._factor_names[index]
+        self.weights = np.delete(self.weights, index)
+        self.scores = np.delete(self.scores, index, axis=0)
+
+    def remove_alternative(self, alternative_id):
+        index = self.alternative_index(alternative_id)
+        self.alternative_ids = np.delete(self.alternative_ids, index)
+        del self._alternative_names[index]
+        self.scores = np.delete(self.scores, index, axis=1)
+
+    def rename_alternative(self, alternative_id, name):
+        self._alternative_names[self.alternative_index(alternative_id)] = name
+
+    # Valori
+
+    def set_weight(self, factor_id, value):
+        self.weights[self.factor_index(factor_id)] = _check_value(value)
+
+    def set_score(self, factor_id, alternative_id, value):
+        self.scores[self.factor_index(factor_id), self.alternative_index(alternative_id)] = _check_value(value)
+
+    def alternative_labels(self):
+        """Nomi da mostrare, resi univoci: le alternative senza nome o con nome ripetuto
+        vengono distinte con il loro ID."""
+        counts = Counter(self._alternative_names)
+        # I nomi già univoci restano come sono; le etichette generate che coincidono con
+        # un'etichetta già presa (es. un nome scritto "Alternativa #2") ricevono di nuovo l'ID
+        taken = {name for name in self._alternative_names if name.strip() and counts[name] == 1}
+        labels = []
+        for alternative_id, name in zip(self.alternative_ids.tolist(), self._alternative_names):
+            if name.strip() and counts[name] == 1:
+                labels.append(name)
+                continue
+            label = f"{name} (#{alternative_id})" if name.strip() else f"Alternativa #{alternative_id}"
+            while label in taken:
+                label = f"{label} (#{alternative_id})"
+            taken.add(label)
+            labels.append(label)
+        return labels
+
+    def to_frame(self):
+        """Matrice fattori x alternative come DataFrame, con le etichette univoche come colonne."""
+        import pandas as pd
+
+        return pd.DataFrame(self.scores.astype(np.int64), index=self.factor_names,
+                            columns=self.alternative_labels())
@@ -0,0 +1,210 @@
+"""Metodi di aggregazione multicriterio (MCDA) dietro un'interfaccia comune.
+
+Ogni motore lavora a lotti: riceve pesi (M, F), punteggi (M, F, A) e, per i metodi
+che ne tengono conto, la direzione di ogni fattore, (F,) o (M, F) (``BENEFIT`` se
+un punteggio alto è un vantaggio, ``COST`` se è uno svantaggio, come per costi e
+rischi). Restituisce un ``scoring.BatchScoringResult`` con totali e classifica,
+quindi può essere usato sia dalla UI (M = 1) sia dal ricalcolo in blocco di
+``batch.py``.
+
+    engine = get_engine("topsis")
+    result = engine.rank(weights, scores, directions)
+
+Motori disponibili: somma ponderata (quella storica dell'app), somma ponderata
+normalizzata, TOPSIS e AHP.
+"""
+import numpy as np
+
+from decision_matrix import MAX_VALUE, MIN_VALUE
+from scoring import BatchScoringResult, check_shapes, score_batch
+
+BENEFIT = 1
+COST = -1
+
+# Indice di consistenza casuale di Saaty per matrici di ordine n (posizione n)
+RANDOM_INDEX = (0.0, 0.0, 0.0, 0.58, 0.90, 1.12, 1.24, 1.32, 1.41, 1.45, 1.49,
+                1.51, 1.48, 1.56, 1.57, 1.59)
+
+
+def _as_batch(weights, scores, directions=None):
+    weights = np.asarray(weights, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    if weights.ndim == 1:
+        weights, scores = weights[np.newaxis], scores[np.newaxis]
+    check_shapes(weights, scores, batch=True)
+    if directions is None:
+        directions = np.full(weights.shape[1], BENEFIT)
+    directions = np.asarray(directions)
+    if directions.shape not in (weights.shape[1:], weights.shape):
+        raise ValueError(f"Serve una direzione per fattore, non {directions.shape}")
+    return weights, scores, np.broadcast_to(directions, weights.shape)
+
+
+def _divide(numerator, denominator):
+    # Divisione che restituisce 0 dove il denominatore è 0 (es. fattori aggiunti con peso 0)
+    return np.divide(numerator, denominator, out=np.zeros(np.broadcast(numerator, denominator).shape),
+                     where=denominator != 0)
+
+
+class ScoringEngine:
+    name = ""
+    label = ""
+
+    def totals(self, weights, scores, directions=None):
+        """Punteggi (M, A) delle alternative: più alto è meglio."""
+        raise NotImplementedError
+
+    def contributions(self, weights, scores, directions=None):
+        """Peso di ogni fattore nel punteggio delle alternative, (M, F, A).
+
+        Per i metodi non additivi (TOPSIS) è quello della somma ponderata normalizzata:
+        serve a spiegare il risultato, tiene conto dei fattori di costo.
+        """
+        return _normalized_contributions(*_as_batch(weights, scores, directions))
+
+    def rank(self, weights, scores, directions=None):
+        totals = self.totals(weights, scores, directions)
+        return BatchScoringResult(totals, np.argsort(-totals, axis=1, kind="stable"))
+
+
+def _normalized_contributions(weights, scores, directions):
+    normalized = (scores - MIN_VALUE) / (MAX_VALUE - MIN_VALUE)
+    normalized = np.where((directions == COST)[:, :, np.newaxis], 1 - normalized, normalized)
+    weights = _divide(weights, weights.sum(axis=1, keepdims=True))
+    return weights[:, :, np.newaxis] * normalized
+
+
+class WeightedSum(ScoringEngine):
+    """Somma dei punteggi moltiplicati per i pesi; la direzione dei fattori è ignorata."""
+    name = "weighted_sum"
+    label = "Somma ponderata"
+
+    def totals(self, weights, scores, directions=None):
+        weights, scores, _ = _as_batch(weights, scores, directions)
+        return score_batch(weights, scores).totals
+
+    def contributions(self, weights, scores, directions=None):
+        weights, scores, _ = _as_batch(weights, scores, directions)
+        return weights[:, :, np.newaxis] * scores
+
+
+class NormalizedWeightedSum(ScoringEngine):
+    """Somma ponderata con pesi normalizzati a 1 e punteggi riportati su 0-1 sulla scala
+    fissa 1-10, rovesciata per i fattori di costo. Il risultato va da 0 a 1."""
+    name = "normalized"
+    label = "Somma ponderata normalizzata (costi e benefici)"
+
+    def totals(self, weights, scores, directions=None):
+        return self.contributions(weights, scores, directions).sum(axis=1)
+
+
+class Topsis(ScoringEngine):
+    """TOPSIS: vicinanza relativa di ogni alternativa alla soluzione ideale rispetto a
+    quella peggiore, con normalizzazione vettoriale per fattore."""
+    name = "topsis"
+    label = "TOPSIS"
+
+    def totals(self, weights, scores, directions=None):
+        weights, scores, directions = _as_batch(weights, scores, directions)
+        norms = np.sqrt((scores ** 2).sum(axis=2, keepdims=True))
+        weights = _divide(weights, weights.sum(axis=1, keepdims=True))
+        weighted = _divide(scores, norms) * weights[:, :, np.newaxis]
+
+        is_cost = directions == COST
+        best = np.where(is_cost, weighted.min(axis=2), weighted.max(axis=2))[:, :, np.newaxis]
+        worst = np.where(is_cost, weighted.max(axis=2), weighted.min(axis=2))[:, :, np.newaxis]
+        to_best = np.sqrt(((weighted - best) ** 2).sum(axis=1))
+        to_worst = np.sqrt(((weighted - worst) ** 2).sum(axis=1))
+        # Alternative indistinguibili (distanza 0 da entrambe) stanno a metà
+        distance = to_best + to_worst
+        return np.where(distance > 0, _divide(to_worst, distance), 0.5)
+
+
+def ahp_priorities(pairwise):
+    """Vettore delle priorità e rapporto di consistenza di matrici di confronto a coppie.
+
+    ``pairwise`` ha forma (..., n, n) con ``pairwise[i, j]`` = quanto i è preferito a j
+    (scala di Saaty 1/9-9, reciproca). Le priorità sono l'autovettore principale
+    normalizzato a somma 1; un rapporto di consistenza oltre 0.1 indica giudizi poco coerenti.
+    """
+    pairwise = np.asarray(pairwise, dtype=np.float64)
+    n = pairwise.shape[-1]
+    eigenvalues, eigenvectors = np.linalg.eig(pairwise)
+    principal = np.argmax(eigenvalues.real, axis=-1)
+    vector = np.take_along_axis(eigenvectors.real, principal[..., np.newaxis, np.newaxis], axis=-1)[..., 0]
+    priorities = np.abs(vector) / np.abs(vector).sum(axis=-1, keepdims=True)
+    lambda_max = np.take_along_axis(eigenvalues.real, principal[..., np.newaxis], axis=-1)[..., 0]
+    if n < 3:
+        return priorities, np.zeros(lambda_max.shape)
+    consistency_index = (lambda_max - n) / (n - 1)
+    random_index = RANDOM_INDEX[n] if n < len(RANDOM_INDEX) else RANDOM_INDEX[-1]
+    return priorities, np.maximum(consistency_index, 0) / random_index
+
+
+def pairwise_from_weights(weights):
+    """Matrice di confronto a coppie perfettamente coerente con pesi assoluti: w_i / w_j."""
+    weights = np.asarray(weights, dtype=np.float64)
+    return weights[..., :, np.newaxis] / weights[..., np.newaxis, :]
+
+
+def reciprocal_pairwise(edited, start):
+    """Matrice di confronto a coppie reciproca da una tabella (n, n) modificata dall'utente.
+
+    Conta il triangolo superiore; una cella modificata sotto la diagonale vale come il
+    reciproco della cella simmetrica, se quella è rimasta al valore iniziale ``start``.
+    Le celle vuote (NaN) tornano al valore iniziale.
+    """
+    start = np.asarray(start, dtype=np.float64)
+    edited = np.asarray(edited, dtype=np.float64)
+    edited = np.where(np.isnan(edited), start, edited)
+    changed = edited != start
+    upper = np.triu(np.where(changed.T & ~changed, _divide(1.0, edited.T), edited), 1)
+    pairwise = upper + np.tril(_divide(1.0, upper.T), -1)
+    np.fill_diagonal(pairwise, 1.0)
+    return pairwise
+
+
+class Ahp(ScoringEngine):
+    """AHP: i pesi dei fattori vengono dall'autovettore principale di una matrice di
+    confronti a coppie (ricavata dai pesi 1-10 se non indicata), le priorità delle
+    alternative per ogni fattore dai rapporti tra i punteggi, invertiti per i costi."""
+    name = "ahp"
+    label = "AHP (confronti a coppie)"
+
+    def totals(self, weights, scores, directions=None, pairwise=None):
+        return self.contributions(weights, scores, directions, pairwise).sum(axis=1)
+
+    def contributions(self, weights, scores, directions=None, pairwise=None):
+        weights, scores, directions = _as_batch(weights, scores, directions)
+        if pairwise is None:
+            # L'autovettore di w_i / w_j è w normalizzato: inutile passare da eig
+            factor_priorities = _divide(weights, weights.sum(axis=1, keepdims=True))
+        else:
+            pairwise = np.asarray(pairwise, dtype=np.float64)
+            if pairwise.ndim == 2:
+                # Una sola matrice per tutto il lotto (es. i campioni dell'analisi di
+                # sensibilità): l'autovettore si calcola una volta
+                priorities, _ = ahp_priorities(pairwise)
+                factor_priorities = np.broadcast_to(priorities, weights.shape)
+            else:
+                factor_priorities, _ = ahp_priorities(pairwise)
+        # Anche i confronti tra alternative (s_i / s_j, o s_j / s_i per i costi) sono
+        # coerenti, quindi le priorità sono i punteggi (o i loro inversi) normalizzati
+        preference = np.where((directions == COST)[:, :, np.newaxis],
+                              _divide(1.0, scores), scores)
+        local = _divide(preference, preference.sum(axis=2, keepdims=True))
+        return factor_priorities[:, :, np.newaxis] * local
+
+    def rank(self, weights, scores, directions=None, pairwise=None):
+        totals = self.totals(weights, scores, directions, pairwise)
+        return BatchScoringResult(totals, np.argsort(-totals, axis=1, kind="stable"))
+
+
+ENGINES = {engine.name: engine for engine in (WeightedSum(), NormalizedWeightedSum(), Topsis(), Ahp())}
+
+
+def get_engine(name):
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise KeyError(f"Motore di calcolo sconosciuto: {name!r} (disponibili: {', '.join(ENGINES)})")
@@ -0,0 +1,129 @@
+"""Generazione dei file di esportazione della Decision Matrix, con cache sul contenuto.
+
+Il file Excel ha lo stesso layout di sempre: "Utente: <nome>" nella riga 0, la
+matrice (colonna "Peso" più una colonna per alternativa) dalla riga 3 e una riga
+"Totale" in fondo. CSV e Parquet usano invece il formato lungo letto da ``batch.py``
+(una riga per fattore, con ``matrix_id`` uguale al nome utente).
+
+Le esportazioni sono memorizzate in una cache LRU limitata, indicizzata da un hash
+del contenuto: ripremere "MOSTRA I RISULTATI" con gli stessi dati non ricrea il file.
+pandas (usato con openpyxl, per CSV e per Parquet) viene importato solo quando serve.
+"""
+import hashlib
+import importlib.util
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+FORMATS = {
+    "xlsx": ("decision_matrix_results.xlsx", XLSX_MIME),
+    "csv": ("decision_matrix_results.csv", "text/csv"),
+    "parquet": ("decision_matrix_results.parquet", "application/vnd.apache.parquet"),
+}
+
+CACHE_SIZE = 128
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def default_excel_engine():
+    # xlsxwriter in modalità constant_memory è molto più veloce e leggero di openpyxl
+    return "xlsxwriter" if importlib.util.find_spec("xlsxwriter") else "openpyxl"
+
+
+def content_hash(user_name, factors, alternatives, weights, scores, fmt, engine):
+    digest = hashlib.sha256()
+    for part in (user_name, fmt, engine, *factors, "\0", *alternatives):
+        digest.update(str(part).encode())
+        digest.update(b"\0")
+    # Tipo, forma e bytes così come sono: convertire prima (es. a interi) renderebbe
+    # uguali array diversi, come pesi 3.4 e 3
+    for array in (weights, scores):
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def build_export(user_name, factors, alternatives, weights, scores, fmt="xlsx", engine=None):
+    """Restituisce i ``bytes`` del file di esportazione, riusando quelli già generati.
+
+    ``weights`` ha un valore per fattore, ``scores`` è la matrice fattori x alternative.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato di esportazione non supportato: {fmt!r}")
+    if fmt == "xlsx" and engine is None:
+        engine = default_excel_engine()
+
+    key = content_hash(user_name, factors, alternatives, weights, scores, fmt, engine)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    weights = np.asarray(weights)
+    scores = np.asarray(scores)
+    if fmt == "xlsx":
+        payload = _write_xlsx(user_name, factors, alternatives, weights, scores, engine)
+    else:
+        payload = _write_long(user_name, factors, alternatives, weights, scores, fmt)
+
+    with _cache_lock:
+        _cache[key] = payload
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return payload
+
+
+def _write_xlsx(user_name, factors, alternatives, weights, scores, engine):
+    totals = (weights @ scores).tolist()
+    buffer = io.BytesIO()
+    if engine == "xlsxwriter":
+        import xlsxwriter
+
+        # constant_memory scrive ogni riga su disco appena completata: le righe vanno scritte in ordine
+        workbook = xlsxwriter.Workbook(buffer, {"constant_memory": True, "in_memory": False})
+        sheet = workbook.add_worksheet("Sheet1")
+        header = workbook.add_format({"bold": True, "border": 1, "align": "center"})
+        index = workbook.add_format({"bold": True, "border": 1})
+        sheet.write_string(0, 0, f"Utente: {user_name}")
+        sheet.write_row(3, 1, ["Peso", *alternatives], header)
+        for i, factor in enumerate(factors):
+            sheet.write_string(4 + i, 0, factor, index)
+            sheet.write_number(4 + i, 1, weights[i])
+            sheet.write_row(4 + i, 2, scores[i].tolist())
+        sheet.write_string(4 + len(factors), 0, "Totale", index)
+        sheet.write_row(4 + len(factors), 2, totals)
+        workbook.close()
+    else:
+        import pandas as pd
+
+        df_display = pd.DataFrame(scores, index=factors, columns=alternatives)
+        df_display.insert(0, "Peso", weights)
+        # Aggiungi una riga "Totale" con i punteggi totali; la colonna "Peso" resta vuota
+        df_display = df_display.astype(object)
+        df_display.loc["Totale"] = [""] + totals
+        with pd.ExcelWriter(buffer, engine=engine) as writer:
+            info_df = pd.DataFrame([f"Utente: {user_name}"])
+            info_df.to_excel(writer, index=False, header=False, startrow=0)
+            df_display.to_excel(writer, startrow=3, index=True)
+    return buffer.getvalue()
+
+
+def _write_long(user_name, factors, alternatives, weights, scores, fmt):
+    import pandas as pd
+
+    frame = pd.DataFrame(scores, columns=alternatives)
+    frame.insert(0, "Peso", weights)
+    frame.insert(0, "Fattore", factors)
+    frame.insert(0, "matrix_id", user_name)
+    buffer = io.BytesIO()
+    if fmt == "csv":
+        frame.to_csv(buffer, index=False)
+    else:
+        frame.to_parquet(buffer, index=False)
+    return buffer.getvalue()
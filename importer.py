@@ -0,0 +1,253 @@
+"""Importazione dei file Excel esportati dall'app (``decision_matrix_results.xlsx``).
+
+Il layout atteso è quello scritto da ``export.py``::
+
+    riga 1    Utente: <nome>
+    riga 4    (vuota) | Peso | <alternativa> | <alternativa> ...
+    riga 5+   <fattore> | <peso> | <punteggio> | <punteggio> ...
+    ultima    Totale | (vuota) | <totale> | <totale> ...
+
+I file vengono letti una riga alla volta con python-calamine, se installato (molto più
+veloce), altrimenti con openpyxl in modalità ``read_only``, e validati: pesi e punteggi
+interi da 1 a 10, nomi non ripetuti, totali coerenti con pesi e punteggi. Le alternative
+senza nome (come la terza strategia predefinita) diventano "Alternativa #<posizione>".
+
+``read_export`` legge un singolo file (anche caricato dalla UI); ``load_directory``
+importa in parallelo tutti gli export di una cartella come ``store.Submission``::
+
+    python importer.py export_telegram/ --store submissions.sqlite3 --processes 8
+"""
+import argparse
+import hashlib
+import importlib.util
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+from catalog import CATALOG_DIR, catalog_paths, load_catalog
+from decision_matrix import MAX_VALUE, MIN_VALUE
+from store import Submission, SubmissionStore
+
+USER_PREFIX = "Utente: "
+HEADER_ROW = 4  # riga (da 1, come in Excel) con "Peso" e i nomi delle alternative
+TOTAL_LABEL = "Totale"
+
+# Catalogo assegnato agli export i cui fattori non corrispondono a nessun catalogo
+IMPORTED_CATALOG = "importati"
+
+
+class ImportedMatrix(NamedTuple):
+    user_name: str
+    factors: Tuple[str, ...]
+    alternatives: Tuple[str, ...]
+    weights: np.ndarray  # (F,) int8
+    scores: np.ndarray   # (F, A) int8
+
+
+def default_reader():
+    return "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
+
+
+def iter_rows(source, reader=None):
+    """Righe del primo foglio come liste di valori, con ``None`` per le celle vuote.
+
+    ``source`` è un percorso o un file aperto in binario (es. un file caricato da Streamlit).
+    """
+    reader = reader or default_reader()
+    if reader == "calamine":
+        from python_calamine import load_workbook
+
+        sheet = load_workbook(source).get_sheet_by_index(0)
+        # Il foglio può iniziare dopo A1 se le prime righe o colonne sono vuote
+        first_row, first_column = sheet.start or (0, 0)
+        for _ in range(first_row):
+            yield []
+        for row in sheet.iter_rows():
+            yield [None] * first_column + [None if value == "" else value for value in row]
+    else:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            for row in workbook.worksheets[0].iter_rows(values_only=True):
+                yield [None if value == "" else value for value in row]
+        finally:
+            workbook.close()
+
+
+def _is_blank(row):
+    return all(value is None for value in row)
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ""
+
+
+def _header_text(value):
+    # Excel può salvare come numero un nome come "2024"
+    return _text(value) if value is None or isinstance(value, str) else str(value).strip()
+
+
+def _check_value(value, what, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not float(value).is_integer():
+        raise ValueError(f"{where}: {what} non è un numero intero ({value!r})")
+    if not MIN_VALUE <= value <= MAX_VALUE:
+        raise ValueError(f"{where}: {what} deve essere compreso tra {MIN_VALUE} e {MAX_VALUE}, non {value:g}")
+    return int(value)
+
+
+def parse_rows(rows, name="file"):
+    """Valida le righe di un export e restituisce un ``ImportedMatrix``.
+
+    Solleva ``ValueError`` con il numero di riga (da 1, come in Excel) se il layout non torna.
+    """
+    rows = iter(rows)
+    first = next(rows, None) or [None]
+    if not isinstance(first[0], str) or not first[0].startswith(USER_PREFIX):
+        raise ValueError(f"{name}, riga 1: manca \"{USER_PREFIX}<nome>\"")
+    user_name = first[0][len(USER_PREFIX):].strip()
+
+    for _ in range(2, HEADER_ROW):
+        next(rows, None)
+    header = next(rows, None)
+    if header is None or len(header) < 3 or _text(header[1]) != "Peso":
+        raise ValueError(f"{name}, riga {HEADER_ROW}: manca l'intestazione con la colonna \"Peso\"")
+    rows = list(rows)
+    # Le colonne in fondo vuote in ogni riga non sono alternative; una colonna con dei
+    # valori ma senza intestazione è un'alternativa lasciata senza nome nell'app
+    width = len(header)
+    while width > 2 and header[width - 1] is None and all(
+            len(row) < width or row[width - 1] is None for row in rows):
+        width -= 1
+    alternatives = [_header_text(cell) or f"Alternativa #{number}"
+                    for number, cell in enumerate(header[2:width], start=1)]
+    if not alternatives:
+        raise ValueError(f"{name}, riga {HEADER_ROW}: nomi delle alternative mancanti")
+    if len(set(alternatives)) != len(alternatives):
+        raise ValueError(f"{name}, riga {HEADER_ROW}: alternative ripetute")
+
+    factors, weights, scores, totals = [], [], [], None
+    for number, row in enumerate(rows, start=HEADER_ROW + 1):
+        row = list(row[:width]) + [None] * (width - len(row))
+        where = f"{name}, riga {number}"
+        if totals is not None:
+            if not _is_blank(row):
+                raise ValueError(f"{where}: dati dopo la riga \"{TOTAL_LABEL}\"")
+            continue
+        label = _text(row[0])
+        if label == TOTAL_LABEL:
+            totals = row[2:]
+            continue
+        if not label:
+            raise ValueError(f"{where}: nome del fattore mancante")
+        factors.append(label)
+        weights.append(_check_value(row[1], "il peso", where))
+        scores.append([_check_value(value, f"il punteggio di '{alternative}'", where)
+                       for value, alternative in zip(row[2:], alternatives)])
+
+    if not factors:
+        raise ValueError(f"{name}: nessun fattore")
+    if totals is None:
+        raise ValueError(f"{name}: manca la riga \"{TOTAL_LABEL}\"")
+    if len(set(factors)) != len(factors):
+        raise ValueError(f"{name}: fattori ripetuti")
+    weights = np.array(weights, dtype=np.int8)
+    scores = np.array(scores, dtype=np.int8)
+    expected = weights.astype(np.int64) @ scores.astype(np.int64)
+    if any(not isinstance(value, (int, float)) for value in totals) or not np.allclose(totals, expected):
+        raise ValueError(f"{name}: la riga \"{TOTAL_LABEL}\" non corrisponde a pesi e punteggi")
+    return ImportedMatrix(user_name, tuple(factors), tuple(alternatives), weights, scores)
+
+
+def read_export(source, name=None, reader=None):
+    """Legge e valida un export (percorso o file binario aperto)."""
+    if name is None:
+        name = Path(source).name if isinstance(source, (str, os.PathLike)) else "file"
+    try:
+        return parse_rows(iter_rows(source, reader), name)
+    except ValueError:
+        raise
+    except Exception as exc:
+        # File corrotti o che non sono fogli Excel
+        raise ValueError(f"{name}: impossibile leggere il file ({exc})") from exc
+
+
+def match_catalog(factors, directory=CATALOG_DIR):
+    """ID del catalogo con esattamente gli stessi fattori, nello stesso ordine, o ``None``."""
+    for catalog_id, path in catalog_paths(directory).items():
+        if tuple(load_catalog(path).factor_names) == tuple(factors):
+            return catalog_id
+    return None
+
+
+def _load_file(path, directory):
+    # Eseguita nei processi del pool: restituisce (percorso, Submission o None, errore o None)
+    try:
+        imported = read_export(path)
+    except ValueError as exc:
+        return str(path), None, str(exc)
+    # Il contenuto del file identifica l'invio: reimportarlo sostituisce quello già archiviato
+    rater = "export:" + hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    submission = Submission(imported.user_name, match_catalog(imported.factors, directory) or IMPORTED_CATALOG,
+                            imported.factors, imported.alternatives, imported.weights, imported.scores,
+                            created_at=os.path.getmtime(path), rater=rater)
+    return str(path), submission, None
+
+
+def load_directory(directory, store=None, processes=None, pattern="*.xlsx", catalogs=CATALOG_DIR):
+    """Importa tutti gli export di ``directory`` (sottocartelle comprese).
+
+    I file sono letti e validati in parallelo da ``processes`` processi; le matrici
+    valide vengono aggiunte a ``store`` (se indicato) a gruppi, man mano che arrivano.
+    File con lo stesso contenuto, anche importati in precedenza, sono archiviati una volta sola.
+    Restituisce (matrici importate, lista di (file, errore) scartati).
+    """
+    paths = sorted(Path(directory).rglob(pattern))
+    imported, errors, pending = [], [], []
+    processes = processes or os.cpu_count() or 1
+    # Blocchi di file per processo: un export si legge in pochi millisecondi
+    chunksize = max(1, len(paths) // (processes * 4))
+    with ProcessPoolExecutor(processes) as pool:
+        results = pool.map(_load_file, paths, [catalogs] * len(paths), chunksize=chunksize)
+        for path, submission, error in results:
+            if error is not None:
+                errors.append((path, error))
+                continue
+            imported.append(submission)
+            pending.append(submission)
+            if store is not None and len(pending) >= store.batch_size:
+                store.add_many(pending)
+                pending = []
+    if store is not None and pending:
+        store.add_many(pending)
+    return imported, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa in blocco gli export Excel della Decision Matrix.")
+    parser.add_argument("directory", help="Cartella con i file decision_matrix_results*.xlsx")
+    parser.add_argument("--store", default=os.environ.get("DECISION_MATRIX_STORE", "submissions.sqlite3"),
+                        help="Archivio SQLite in cui salvare gli invii")
+    parser.add_argument("--processes", type=int, help="Processi usati per leggere i file (predefinito: tutti i core)")
+    parser.add_argument("--pattern", default="*.xlsx", help="Quali file importare")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    store = SubmissionStore(args.store)
+    try:
+        imported, errors = load_directory(args.directory, store, args.processes, args.pattern)
+    finally:
+        store.close()
+    for path, error in errors:
+        print(f"Scartato {error}", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    print(f"{len(imported)} file importati, {len(errors)} scartati in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
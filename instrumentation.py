@@ -0,0 +1,220 @@
+"""Misura dei tempi di ogni rerun dello script, per fase.
+
+Ogni esecuzione di ``sceltacasa.main()`` è un ``ScriptRun`` diviso in fasi
+(``inputs``, ``scoring``, ``rendering``, ``export``, ``delivery``, ...): ``phase(name)``
+chiude la fase in corso e ne apre un'altra, ``span(name)`` misura un blocco annidato.
+Le durate finiscono in un registro di processo, esportato:
+
+* come testo Prometheus in ``<DECISION_MATRIX_METRICS_DIR>/metrics.prom`` (adatto al
+  textfile collector di node_exporter) e, se è impostata ``DECISION_MATRIX_METRICS_PORT``,
+  su ``http://127.0.0.1:<porta>/metrics`` (``DECISION_MATRIX_METRICS_HOST=0.0.0.0`` per
+  renderlo raggiungibile da altre macchine);
+* come una riga JSON per rerun in ``<DECISION_MATRIX_METRICS_DIR>/reruns.jsonl``.
+
+Con ``DECISION_MATRIX_PROFILING=1`` si può attivare per una singola sessione anche il
+profiling completo di ogni rerun con pyinstrument, se installato, altrimenti con
+cProfile; il risultato viene salvato nella stessa cartella (o in quella temporanea).
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+METRICS_DIR = os.environ.get("DECISION_MATRIX_METRICS_DIR")
+METRICS_PORT = os.environ.get("DECISION_MATRIX_METRICS_PORT")
+METRICS_HOST = os.environ.get("DECISION_MATRIX_METRICS_HOST", "127.0.0.1")
+PROFILING_ENABLED = os.environ.get("DECISION_MATRIX_PROFILING") == "1"
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry:
+    """Istogrammi delle durate per fase, condivisi da tutte le sessioni del processo."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.phases = {}
+        self.reruns = 0
+        self._lock = threading.Lock()
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            buckets, count, total = self.phases.get(phase, ([0] * len(self.buckets), 0, 0.0))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self.phases[phase] = (buckets, count + 1, total + seconds)
+
+    def count_rerun(self):
+        with self._lock:
+            self.reruns += 1
+
+    def prometheus(self):
+        lines = [
+            "# HELP decision_matrix_reruns_total Rerun completi dello script.",
+            "# TYPE decision_matrix_reruns_total counter",
+            f"decision_matrix_reruns_total {self.reruns}",
+            "# HELP decision_matrix_phase_seconds Durata delle fasi di un rerun.",
+            "# TYPE decision_matrix_phase_seconds histogram",
+        ]
+        with self._lock:
+            phases = {phase: (list(buckets), count, total)
+                      for phase, (buckets, count, total) in self.phases.items()}
+        for phase, (buckets, count, total) in sorted(phases.items()):
+            for bound, observations in zip(self.buckets, buckets):
+                lines.append(f'decision_matrix_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {observations}')
+            lines.append(f'decision_matrix_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {count}')
+            lines.append(f'decision_matrix_phase_seconds_sum{{phase="{phase}"}} {total:.6f}')
+            lines.append(f'decision_matrix_phase_seconds_count{{phase="{phase}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class ScriptRun:
+    def __init__(self, session_id, registry=REGISTRY):
+        self.session_id = session_id
+        self.registry = registry
+        self.started = time.perf_counter()
+        self.durations = {}
+        self._phase = None
+        self._phase_started = None
+
+    def _record(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.registry.observe(name, seconds)
+
+    @property
+    def current_phase(self):
+        return self._phase
+
+    def phase(self, name):
+        """Chiude la fase in corso (se c'è) e inizia ``name``."""
+        now = time.perf_counter()
+        if self._phase is not None:
+            self._record(self._phase, now - self._phase_started)
+        self._phase, self._phase_started = name, now
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - started)
+
+    def finish(self):
+        self.phase(None)
+        self._phase = None
+        total = time.perf_counter() - self.started
+        self._record("total", total)
+        self.registry.count_rerun()
+        return total
+
+
+def _metrics_dir():
+    if METRICS_DIR is None:
+        return None
+    path = Path(METRICS_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def write_metrics(run, status, directory=None):
+    """Aggiunge il rerun a ``reruns.jsonl`` e riscrive ``metrics.prom`` in modo atomico."""
+    directory = directory or _metrics_dir()
+    if directory is None:
+        return
+    record = {"ts": time.time(), "session": run.session_id, "status": status,
+              "seconds": {name: round(value, 6) for name, value in run.durations.items()}}
+    with open(directory / "reruns.jsonl", "a", encoding="utf-8") as log:
+        log.write(json.dumps(record) + "\n")
+    with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".tmp") as tmp:
+        tmp.write(run.registry.prometheus())
+    os.replace(tmp.name, directory / "metrics.prom")
+
+
+@contextmanager
+def _profiler(session_id):
+    directory = _metrics_dir() or Path(tempfile.gettempdir())
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(directory / f"profile-{session_id}-{stamp}.prof")
+    else:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            (directory / f"profile-{session_id}-{stamp}.html").write_text(profiler.output_html(), encoding="utf-8")
+
+
+@contextmanager
+def script_run(session_id, profile=False):
+    """Misura un rerun completo; con ``profile=True`` ne salva anche il profilo."""
+    run = ScriptRun(session_id)
+    status = "error"
+    try:
+        if profile:
+            with _profiler(session_id):
+                yield run
+        else:
+            yield run
+        status = "ok"
+    except BaseException as exc:
+        # st.stop() e st.rerun() interrompono lo script con un'eccezione: non è un errore
+        if type(exc).__name__ in ("StopException", "RerunException"):
+            status = "interrupted"
+        raise
+    finally:
+        run.finish()
+        write_metrics(run, status)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port=None, host=None):
+    """Espone il registro su ``/metrics`` in un thread; None se nessuna porta è configurata.
+
+    Per default ascolta solo su localhost (``METRICS_HOST``).
+    """
+    port = port if port is not None else METRICS_PORT
+    host = host or METRICS_HOST
+    if port is None:
+        return None
+    server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -1,9 +1,249 @@
-import pandas as pd
 import streamlit as st
-import requests
-import io  # per gestire file in memoria
+import os
+import uuid
+import numpy as np
+
+from aggregation import CatalogAggregates
+from catalog import DEFAULT_CATALOG, catalog_paths, get_catalog, load_catalog
+from decision_matrix import DecisionMatrix
+from engines import BENEFIT, COST, ENGINES, ahp_priorities, get_engine, reciprocal_pairwise
+from export import FORMATS, build_export
+from importer import match_catalog, read_export
+from instrumentation import PROFILING_ENABLED, script_run, serve_metrics
+from scoring import score_matrix, top_k
+from sensitivity import minimal_flip, rank_probabilities
+from store import Submission, SubmissionStore
+from telegram_outbox import FAILED, SENT, TELEGRAM_API_URL, Outbox, TelegramSender
+
+@st.cache_resource
+def get_outbox():
+    # Una sola coda e un solo thread di invio per processo, condivisi da tutte le sessioni
+    outbox = Outbox(os.environ.get("DECISION_MATRIX_OUTBOX", "outbox.sqlite3"))
+    bot_token = st.secrets.telegram.bot_token  # Token dal file secrets
+    api_url = st.secrets.telegram.get("api_url", TELEGRAM_API_URL)
+    TelegramSender(outbox, bot_token, api_url=api_url).start()
+    return outbox
+
+@st.cache_resource
+def get_store():
+    # Archivio degli invii condiviso da tutte le sessioni del processo
+    return SubmissionStore(os.environ.get("DECISION_MATRIX_STORE", "submissions.sqlite3"))
+
+@st.cache_resource
+def get_metrics_server():
+    # Un solo endpoint /metrics per processo, se DECISION_MATRIX_METRICS_PORT è impostata
+    return serve_metrics()
+
+@st.cache_resource
+def get_catalog_aggregates(catalog_id):
+    # Aggregati di gruppo condivisi tra le sessioni e aggiornati solo con i nuovi invii
+    return CatalogAggregates(catalog_id)
+
+@st.cache_resource(ttl=60)
+def catalog_names():
+    # Nomi dei cataloghi disponibili, costruiti una volta per processo (e riletti al più
+    # una volta al minuto, per vedere i cataloghi aggiunti)
+    return {catalog_id: load_catalog(path).name for catalog_id, path in catalog_paths().items()}
+
+@st.cache_resource
+def explanations_markdown(catalog):
+    # Testo della sezione "Spiegazione dei criteri", costruito una volta per catalogo;
+    # se il file del catalogo cambia, cambia anche la chiave della cache
+    lines = ["Qui trovi una descrizione dettagliata di ciascun criterio:"]
+    lines += [f"**{factor.name}**: {factor.explanation}" for factor in catalog.factors]
+    return "\n\n".join(lines)
+
+def catalog_name(catalog_id):
+    return catalog_names().get(catalog_id, catalog_id)
+
+def show_delivery_status(message_id):
+    status = get_outbox().status(message_id)
+    if status is None:
+        return
+    if status[0] == SENT:
+        st.success("Dati generati correttamente!")
+    elif status[0] == FAILED:
+        st.error("Errore nell'invio del file Excel a Telegram.")
+    else:
+        st.info("Dati generati correttamente! Invio del file Excel a Telegram in corso...")
+
+TABLE_METHOD = "Compila pesi e punteggi in un'unica tabella (più veloce)"
+
+# Numero massimo di alternative affiancate su una riga quando si valuta un fattore alla volta
+MAX_COLUMNS = 4
+
+def alternative_letter(alternative_id):
+    # A, B, ..., Z, AA, AB, ... come le colonne di un foglio di calcolo
+    letters = ""
+    while alternative_id > 0:
+        alternative_id, rest = divmod(alternative_id - 1, 26)
+        letters = chr(65 + rest) + letters
+    return letters
+
+def get_matrix(catalog):
+    # La matrice vive nella sessione, così gli ID di fattori e alternative restano stabili
+    # tra i rerun; cambiando catalogo (o se il file del catalogo cambia) si riparte da capo
+    matrix = st.session_state.get("matrix")
+    if (matrix is None or st.session_state.get("matrix_catalog") != catalog.id
+            or matrix.factor_names != catalog.factor_names):
+        matrix = st.session_state.matrix = DecisionMatrix(catalog.factor_names, catalog.default_alternatives)
+        st.session_state.matrix_catalog = catalog.id
+    return matrix
+
+def restore_export(uploaded):
+    # Ricarica nella sessione una matrice esportata: sceglie il catalogo con gli stessi
+    # fattori e riparte dai nomi, dai pesi e dai punteggi del file
+    try:
+        imported = read_export(uploaded, name=uploaded.name)
+    except ValueError as exc:
+        st.error(f"Impossibile importare il file: {exc}")
+        return
+    catalog_id = match_catalog(imported.factors)
+    if catalog_id is None:
+        st.error("I fattori del file non corrispondono a nessuna delle decisioni disponibili.")
+        return
+    matrix = DecisionMatrix(imported.factors, imported.alternatives)
+    matrix.weights[:] = imported.weights
+    matrix.scores[:] = imported.scores
+    # Senza i valori salvati nei widget del catalogo, slider e tabella ripartono dalla matrice
+    for key in [key for key in st.session_state if str(key).startswith(f"{catalog_id}_")]:
+        del st.session_state[key]
+    st.session_state.matrix = matrix
+    st.session_state.matrix_catalog = st.session_state.catalog = catalog_id
+    st.success(f"Caricata la Decision Matrix di {imported.user_name}: "
+               f"{len(imported.factors)} fattori, {len(imported.alternatives)} alternative.")
+
+def alternative_inputs(matrix, catalog):
+    names = matrix.alternative_names
+    for alternative_id, name in zip(matrix.alternative_ids.tolist(), names):
+        name_col, remove_col = st.columns([5, 1], vertical_alignment="bottom")
+        with name_col:
+            name = st.text_input(f"Nome per {catalog.alternative.capitalize()} {alternative_letter(alternative_id)}",
+                                 name, key=f"{catalog.id}_name_{alternative_id}")
+            matrix.rename_alternative(alternative_id, name)
+        with remove_col:
+            st.button("Rimuovi", key=f"{catalog.id}_remove_{alternative_id}",
+                      on_click=matrix.remove_alternative, args=(alternative_id,),
+                      disabled=len(names) <= 1)
+    st.button(f"Aggiungi {catalog.alternative}", on_click=matrix.add_alternative)
+
+def alternative_columns(count):
+    # Dispone le alternative su più righe di al massimo MAX_COLUMNS colonne
+    cols = []
+    for start in range(0, count, MAX_COLUMNS):
+        cols.extend(st.columns(min(MAX_COLUMNS, count - start)))
+    return cols
+
+def evaluation_form(matrix, catalog):
+    import pandas as pd
+
+    factors = matrix.factor_names
+    labels = matrix.alternative_labels()
+    # La tabella parte dai valori della matrice (1 per una matrice nuova, o quelli importati)
+    grid = pd.DataFrame(matrix.scores.astype(int), index=pd.Index(factors, name="Fattore"), columns=labels)
+    grid.insert(0, "Peso", matrix.weights.astype(int))
+    grid.insert(0, "Spiegazione", [factor.explanation or factor.hint for factor in catalog.factors])
+    score_column = st.column_config.NumberColumn(min_value=1, max_value=10, step=1, required=True)
+
+    with st.form("evaluation_form"):
+        edited = st.data_editor(
+            grid,
+            column_config={
+                "Spiegazione": st.column_config.TextColumn(disabled=True),
+                "Peso": st.column_config.NumberColumn(
+                    "Peso", help="1 = meno importante, 10 = importantissimo",
+                    min_value=1, max_value=10, step=1, required=True),
+                **{label: score_column for label in labels},
+            },
+            # La tabella riparte da capo quando si aggiungono o rimuovono alternative
+            key=f"{catalog.id}_grid_" + "_".join(map(str, matrix.alternative_ids.tolist())),
+        )
+        st.form_submit_button("Conferma i valori")
+
+    matrix.weights[:] = edited["Peso"].to_numpy()
+    matrix.scores[:] = edited[labels].to_numpy()
+
+def ahp_pairwise_editor(matrix, catalog):
+    # Confronti a coppie tra fattori (scala di Saaty 1/9-9): conta il triangolo superiore,
+    # l'inferiore è il reciproco. I valori iniziali sono i rapporti tra i pesi.
+    import pandas as pd
+
+    factors = matrix.factor_names
+    with st.expander("Confronti a coppie tra i fattori (AHP)"):
+        st.write("Per ogni coppia indica quanto il fattore della riga è più importante di quello "
+                 "della colonna (1 = uguale, 9 = molto più importante, 1/9 = molto meno). "
+                 "Basta compilare le celle sopra la diagonale: una cella modificata sotto "
+                 "la diagonale vale come il reciproco di quella simmetrica.")
+        weights = matrix.weights.astype(float)
+        start = pd.DataFrame(np.round(np.clip(weights[:, None] / weights[None, :], 1 / 9, 9), 2),
+                             index=factors, columns=factors)
+        # La chiave dipende solo dai fattori: spostando un peso i confronti già inseriti restano
+        edited = st.data_editor(
+            start, key=f"{catalog.id}_ahp_" + "_".join(map(str, matrix.factor_ids.tolist())),
+            column_config={factor: st.column_config.NumberColumn(min_value=1 / 9, max_value=9.0)
+                           for factor in factors},
+        ).to_numpy(dtype=float)
+        pairwise = reciprocal_pairwise(edited, start.to_numpy(dtype=float))
+        _, consistency = ahp_priorities(pairwise)
+        if consistency > 0.1:
+            st.warning(f"Rapporto di consistenza {consistency:.2f}: i confronti sono poco coerenti tra loro "
+                       "(si consiglia di restare sotto 0,10).")
+        else:
+            st.caption(f"Rapporto di consistenza: {consistency:.2f}")
+    return pairwise
+
+def group_view():
+    import pandas as pd
+
+    st.title("Risultati di gruppo")
+    counts = get_store().counts()
+    if not counts:
+        st.info("Non ci sono ancora invii registrati.")
+        return
+
+    catalog_id = st.selectbox("Decisione", list(counts),
+                              format_func=lambda item: f"{catalog_name(item)} ({counts[item]} invii)")
+    groups = get_catalog_aggregates(catalog_id).update(get_store())
+    # Si possono aggregare solo gli invii con gli stessi fattori e le stesse alternative
+    keys = sorted(groups, key=lambda key: -groups[key].count)
+    key = st.selectbox("Alternative valutate", keys,
+                       format_func=lambda key: f"{', '.join(key[1])} ({groups[key].count} invii)")
+    group = groups[key]
+    alternatives = list(group.alternatives)
+
+    st.header(f"Consenso su {group.count} invii")
+    borda_position = np.empty(len(alternatives), dtype=int)
+    borda_position[group.borda_ranking()] = np.arange(1, len(alternatives) + 1)
+    summary = pd.DataFrame({
+        "Punteggio medio": group.mean_totals(),
+        "Punteggio mediano": group.median_totals(),
+        "Punti Borda": group.borda_points,
+        "Posizione Borda": borda_position,
+    }, index=alternatives).sort_values("Posizione Borda")
+    st.dataframe(summary)
+    st.bar_chart(summary[["Punteggio medio", "Punteggio mediano"]])
+
+    st.subheader("Classifica di consenso (Kemeny)")
+    st.caption("La classifica che contraddice il minor numero di preferenze a coppie espresse dai partecipanti.")
+    for i, j in enumerate(group.kemeny_ranking(), start=1):
+        st.write(f"{i}. **{alternatives[j]}**")
+
+    st.subheader("Disaccordo tra i partecipanti per fattore")
+    weight_std, score_std = group.factor_dispersion()
+    dispersion = pd.DataFrame({
+        "Dev. std. dei pesi": weight_std,
+        "Dev. std. media dei punteggi": score_std,
+    }, index=list(group.factors)).sort_values("Dev. std. dei pesi", ascending=False)
+    st.dataframe(dispersion)
+
+def app(run):
+    run.phase("inputs")
+    view = st.sidebar.radio("Vista", ["Compila la Decision Matrix", "Risultati di gruppo"])
+    if view == "Risultati di gruppo":
+        run.phase("aggregation")
+        group_view()
+        return
 
-def main():
     # Inizializza lo stato della sessione per abilitare il modulo
     if "proceed" not in st.session_state:
         st.session_state.proceed = False
@@ -21,103 +261,137 @@ def main():
 
     # Se l'utente ha cliccato "Inizia", mostra il modulo completo
     if st.session_state.proceed:
-        st.title("Decision Matrix per la strategia di test delle lampade")
-        st.subheader("Istruzioni: assegna un peso (1-10) a ciascun fattore e poi valuta le strategie.")
-
-        # Personalizza i nomi delle strategie
-        st.header("Personalizza le strategie")
-        strat_a_nome = st.text_input("Nome per Strategia A", "Subito test con pochi follower")
-        strat_b_nome = st.text_input("Nome per Strategia B", "Prima arriviamo a 1000 follower e poi facciamo i test")
-        strat_c_nome = st.text_input("Nome per Strategia C", "")
-        alternatives = [strat_a_nome, strat_b_nome, strat_c_nome]
-
-        # Lista di fattori per la decisione
-        factors = [
-            "Costo della soluzione",
-            "Vantaggio per lo sviluppo di prodotto",
-            "Tempo per realizzarlo",
-            "Tempo per preparare il test",
-            "Costo del test",
-            "Costo di non applicare l'opzione",
-            "Impatto sul coinvolgimento",
-            "Rischio",
-            "Facilità di implementazione",
-            "Potenziale di crescita",
-            "Feedback qualitativo",
-            "Tempismo",
-            "Perdita di opportunità"
-        ]
-
-        # Spiegazioni per ciascun criterio
-        factor_explanations = {
-            "Costo della soluzione": "Quanto spendi per realizzare l'opzione, includendo soldi e risorse (es. pagare un marketer o investire tempo).",
-            "Vantaggio per lo sviluppo di prodotto": "In che misura l'opzione aiuta ad avere un prodotto di maggior successo?",
-            "Tempo per realizzarlo": "Il tempo totale necessario per implementare la strategia, dalla pianificazione all'esecuzione.",
-            "Tempo per preparare il test": "Il tempo necessario per allestire il test: creare i post, rendere i rendering, organizzare il contest.",
-            "Costo del test": "Le spese direttamente legate al test, come materiali, promozione o costi logistici.",
-            "Costo di non applicare l'opzione": "Le opportunità perse se non si applica l'opzione, come mancati guadagni o feedback utili.",
-            "Impatto sul coinvolgimento": "Quanto l'opzione incentiva l'interazione e l'engagement dei follower (like, commenti, condivisioni).",
-            "Rischio": "Il grado di incertezza o la possibilità che la strategia non dia i risultati sperati.",
-            "Facilità di implementazione": "Quanto è semplice mettere in pratica l'opzione, considerando le competenze e risorse disponibili.",
-            "Potenziale di crescita": "La capacità dell'opzione di aumentare i follower e far crescere il brand nel tempo.",
-            "Feedback qualitativo": "La possibilità di raccogliere opinioni utili e dettagliate per migliorare il prodotto.",
-            "Tempismo": "L'importanza del momento in cui agire: testare subito con pochi follower o aspettare un pubblico più ampio.",
-            "Perdita di opportunità": "Cosa rischi di perdere scegliendo un'opzione invece dell'altra, ad esempio guadagni immediati contro un test più accurato in futuro."
-        }
+        # Scegli il catalogo di fattori (può essere indicato anche nel link con ?catalogo=...)
+        catalog_ids = list(catalog_names())
+        if "catalog" not in st.session_state:
+            requested = st.query_params.get("catalogo", DEFAULT_CATALOG)
+            st.session_state.catalog = requested if requested in catalog_ids else catalog_ids[0]
+
+        # Si può anche ripartire da un file Excel esportato in precedenza
+        with st.expander("Riprendi una Decision Matrix esportata"):
+            uploaded = st.file_uploader("File decision_matrix_results.xlsx", type="xlsx")
+        # Il file viene applicato una volta sola, poi le modifiche dell'utente hanno la precedenza
+        if uploaded is not None and st.session_state.get("imported_file") != uploaded.file_id:
+            st.session_state.imported_file = uploaded.file_id
+            restore_export(uploaded)
+
+        catalog_id = st.selectbox("Decisione da prendere", catalog_ids, key="catalog",
+                                  format_func=catalog_name)
+        catalog = get_catalog(catalog_id)
+        factors = catalog.factor_names
+        factor_explanations = catalog.explanations
+        one, many = catalog.alternative, catalog.alternatives
+
+        st.title(catalog.title)
+        st.subheader(catalog.instructions)
+
+        # Personalizza i nomi delle alternative (il loro numero è libero)
+        st.header(f"Personalizza le {many}")
+        matrix = get_matrix(catalog)
+        alternative_inputs(matrix, catalog)
+        alternative_ids = matrix.alternative_ids.tolist()
+        labels = matrix.alternative_labels()
 
         # Sezione espandibile per mostrare la spiegazione dei criteri
-        with st.expander("Spiegazione dei criteri"):
-            st.write("Qui trovi una descrizione dettagliata di ciascun criterio:")
-            for factor in factors:
-                st.write(f"**{factor}**: {factor_explanations[factor]}")
-
-        st.header("Assegna pesi ai fattori")
-        st.write("Indica l'importanza di ciascun fattore (1 = meno importante, 10 = importantissimo)")
-        weights = {}
-        for factor in factors:
-            weights[factor] = st.slider(f"Peso per '{factor}'", 1, 10, 1)
-            st.caption(f"ℹ️ {factor_explanations[factor]}")
+        if any(factor_explanations.values()):
+            with st.expander("Spiegazione dei criteri"):
+                st.markdown(explanations_markdown(catalog))
 
         # Scegli il metodo di valutazione
         st.header("Metodo di valutazione")
-        evaluation_method = st.radio(
-            "Come preferisci valutare le strategie?",
-            ["Valuta un fattore alla volta per tutte le strategie", "Valuta una strategia alla volta per tutti i fattori"]
-        )
+        evaluation_methods = [f"Valuta un fattore alla volta per tutte le {many}",
+                              f"Valuta una {one} alla volta per tutti i fattori",
+                              TABLE_METHOD]
+        evaluation_method = st.radio(f"Come preferisci valutare le {many}?", evaluation_methods)
 
-        data = {alt: [0] * len(factors) for alt in alternatives}
-
-        st.header("Valutazione delle strategie")
-        if evaluation_method == "Valuta un fattore alla volta per tutte le strategie":
-            for i, factor in enumerate(factors):
-                st.subheader(f"Valutazione per '{factor}'")
-                st.caption(f"ℹ️ {factor_explanations[factor]}")
-                st.write(f"Assegna un punteggio da 1 a 10 per ciascuna strategia rispetto a '{factor}'")
-                cols = st.columns(3)
-                for j, alt in enumerate(alternatives):
-                    with cols[j]:
-                        data[alt][i] = st.slider(f"{alt}", 1, 10, 1, key=f"{factor}_{alt}")
+        if evaluation_method == TABLE_METHOD:
+            # Pesi e punteggi in un'unica tabella dentro un form: modificare le celle non
+            # provoca rerun, lo script viene rieseguito solo alla conferma
+            st.header(f"Assegna pesi e valuta le {many}")
+            st.write("Compila la tabella con valori da 1 a 10 e premi \"Conferma i valori\": "
+                     f"la colonna 'Peso' indica l'importanza del fattore, le altre il punteggio di ogni {one}.")
+            evaluation_form(matrix, catalog)
         else:
-            for alt in alternatives:
-                st.subheader(f"Valutazione per {alt}")
-                st.write(f"Assegna un punteggio da 1 a 10 per {alt} rispetto a ciascun fattore")
-                for i, factor in enumerate(factors):
-                    data[alt][i] = st.slider(f"{factor}", 1, 10, 1, key=f"{alt}_{factor}")
-                    st.caption(f"ℹ️ {factor_explanations[factor]}")
+            st.header("Assegna pesi ai fattori")
+            st.write("Indica l'importanza di ciascun fattore (1 = meno importante, 10 = importantissimo)")
+            for i, factor in enumerate(catalog.factors):
+                matrix.weights[i] = st.slider(f"Peso per '{factor.name}'", 1, 10, int(matrix.weights[i]),
+                                              key=f"{catalog.id}_weight_{matrix.factor_ids[i]}")
+                if factor.explanation:
+                    st.caption(f"ℹ️ {factor.explanation}")
+
+            # Le chiavi dei widget usano gli ID stabili, non i nomi scelti dall'utente
+            st.header(f"Valutazione delle {many}")
+            if evaluation_method == evaluation_methods[0]:
+                for i, factor in enumerate(catalog.factors):
+                    st.subheader(f"Valutazione per '{factor.name}'")
+                    if factor.explanation:
+                        st.caption(f"ℹ️ {factor.explanation}")
+                    extra_info = f" ({factor.hint})" if factor.hint else ""
+                    st.write(f"Assegna un punteggio da 1 a 10 per ciascuna {one} rispetto a '{factor.name}'{extra_info}")
+                    cols = alternative_columns(len(alternative_ids))
+                    for j, alternative_id in enumerate(alternative_ids):
+                        with cols[j]:
+                            matrix.scores[i, j] = st.slider(
+                                labels[j], 1, 10, int(matrix.scores[i, j]),
+                                key=f"{catalog.id}_score_{matrix.factor_ids[i]}_{alternative_id}")
+            else:
+                for j, alternative_id in enumerate(alternative_ids):
+                    st.subheader(f"Valutazione per {labels[j]}")
+                    st.write(f"Assegna un punteggio da 1 a 10 per {labels[j]} rispetto a ciascun fattore")
+                    for i, factor in enumerate(catalog.factors):
+                        matrix.scores[i, j] = st.slider(
+                            f"{factor.name}", 1, 10, int(matrix.scores[i, j]), help=factor.hint or None,
+                            key=f"{catalog.id}_score_{matrix.factor_ids[i]}_{alternative_id}")
+                        if factor.explanation:
+                            st.caption(f"ℹ️ {factor.explanation}")
+
+        # Metodo di aggregazione: la somma ponderata storica o un metodo MCDA che tiene
+        # conto dei fattori di costo (dove un punteggio alto è uno svantaggio)
+        st.header("Metodo di calcolo")
+        engine_name = st.selectbox("Come combinare pesi e punteggi", list(ENGINES),
+                                   format_func=lambda name: ENGINES[name].label)
+        pairwise = ahp_pairwise_editor(matrix, catalog) if engine_name == "ahp" else None
 
+        # Opzioni dell'analisi di sensibilità mostrata insieme ai risultati
+        with st.expander("Opzioni dell'analisi di sensibilità"):
+            spread = st.select_slider("Incertezza su pesi e punteggi (±)", [0, 1, 2, 3], value=1)
+            if pairwise is None:
+                sampling = st.radio("Come variare i pesi", ["uniform", "dirichlet"], horizontal=True,
+                                    format_func={"uniform": f"±{spread} punti",
+                                                 "dirichlet": "Distribuzione di Dirichlet"}.get)
+            else:
+                # Con AHP i pesi 1-10 non entrano nel calcolo: variarli non cambierebbe nulla
+                sampling = "uniform"
+                st.caption("Con AHP i pesi dei fattori vengono dai confronti a coppie: "
+                           "le simulazioni variano solo i punteggi.")
+            n_samples = st.select_slider("Numero di simulazioni", [10_000, 100_000, 1_000_000], value=100_000)
 
         # Bottone per mostrare i risultati
         if st.button("MOSTRA I RISULTATI", key="show_results"):
-            # Calcolo dei punteggi ponderati
-            df = pd.DataFrame(data, index=factors)
-            weighted_scores = {}
-            weight_series = pd.Series(weights)
-            for alt in alternatives:
-                weighted_sum = sum(df[alt][i] * weight_series[factor] for i, factor in enumerate(factors))
-                weighted_scores[alt] = weighted_sum
+            # Calcolo dei punteggi ponderati. pandas serve solo da qui in poi: la maggior
+            # parte delle sessioni non arriva ai risultati e non ne paga l'import
+            import pandas as pd
+
+            run.phase("scoring")
+            df = matrix.to_frame()
+            names = labels
+            weight_vector = matrix.weights.astype(np.int64)
+            score_array = matrix.scores.astype(np.int64)
+            directions = catalog.directions
+            engine = get_engine(engine_name)
+            options = {"pairwise": pairwise} if pairwise is not None else {}
+            result = score_matrix(weight_vector, score_array)
+            totals, order = result.totals, result.ranking
+            if engine_name != "weighted_sum":
+                ranked = engine.rank(weight_vector, score_array, directions, **options)
+                totals, order = ranked.totals[0], ranked.ranking[0]
+            weighted_scores = dict(zip(names, totals.tolist()))
+            weight_series = pd.Series(weight_vector, index=factors)
 
-            ranking = sorted(weighted_scores.items(), key=lambda x: x[1], reverse=True)
+            ranking = [(names[j], weighted_scores[names[j]]) for j in order]
 
+            run.phase("rendering")
             st.header("Risultati")
             df_display = df.copy()
             df_display.insert(0, "Peso", weight_series)
@@ -127,272 +401,120 @@ def main():
 
             st.subheader("Punteggi Ponderati")
             weighted_df = pd.DataFrame({
-                'Strategia': [alt for alt, _ in weighted_scores.items()],
+                one.capitalize(): [alt for alt, _ in weighted_scores.items()],
                 'Punteggio': [score for _, score in weighted_scores.items()]
             })
             weighted_df = weighted_df.sort_values('Punteggio', ascending=False)
             st.dataframe(weighted_df)
 
-            st.subheader("Classifica delle Strategie")
+            st.subheader(f"Classifica delle {many.capitalize()}")
             for i, (alt, score) in enumerate(ranking, start=1):
                 st.write(f"{i}. **{alt}** - punteggio: {score:.2f}")
 
             st.subheader("Grafico comparativo")
-            st.bar_chart(weighted_df.set_index('Strategia'))
+            st.bar_chart(weighted_df.set_index(one.capitalize()))
 
             winner = ranking[0][0]
-            st.subheader(f"Perché {winner} è la strategia migliore")
-
-            top_factors = []
-            for factor in factors:
-                factor_score = df[winner][factors.index(factor)] * weights[factor]
-                top_factors.append((factor, factor_score))
-            top_factors.sort(key=lambda x: x[1], reverse=True)
+            st.subheader(f"Perché {winner} è la {one} migliore")
 
+            winner_idx = order[0]
             st.write("Punti di forza:")
-            for factor, score in top_factors[:3]:
-                st.write(f"- **{factor}**: punteggio {df[winner][factors.index(factor)]}/10 × peso {weights[factor]} = {score:.1f} punti")
-
-            # Genera il file Excel in memoria con il nome dell'utente in alto
-            excel_buffer = io.BytesIO()
+            if engine_name == "weighted_sum":
+                # La somma ponderata premia anche i punteggi alti sui fattori di costo, ma
+                # non sono punti di forza: si elencano solo i fattori di beneficio
+                benefit = np.flatnonzero(np.asarray(directions) == BENEFIT)
+                winner_contributions = result.contributions[:, winner_idx]
+                for i in benefit[top_k(winner_contributions[benefit], 3)]:
+                    factor = factors[i]
+                    st.write(f"- **{factor}**: punteggio {df[winner].iloc[i]}/10 × peso {weight_vector[i]} = {winner_contributions[i]:.1f} punti")
+            else:
+                winner_contributions = engine.contributions(weight_vector, score_array, directions,
+                                                            **options)[0, :, winner_idx]
+                shares = winner_contributions / max(winner_contributions.sum(), 1e-12)
+                for i in top_k(winner_contributions, 3):
+                    note = " (più basso è meglio)" if directions[i] == COST else ""
+                    st.write(f"- **{factors[i]}**: punteggio {df[winner].iloc[i]}/10{note}, "
+                             f"{shares[i]:.0%} del punteggio")
+                if engine_name == "topsis":
+                    st.caption("Con TOPSIS il contributo dei fattori è stimato con la somma ponderata normalizzata.")
 
-            # Aggiungi una riga "Totale" al dataframe, con i punteggi totali per ogni strategia.
-            # Lascia vuota la colonna "Peso"
-            totals = [weighted_scores[alt] for alt in alternatives]
-            df_display.loc["Totale"] = [""] + totals
+            run.phase("sensitivity")
+            st.subheader("Quanto è solida la classifica?")
+            # Simulazioni e modifica minima usano lo stesso metodo di calcolo della classifica
+            sensitivity_engine = None if engine_name == "weighted_sum" else engine
+            probabilities = rank_probabilities(weight_vector, score_array, n_samples=n_samples,
+                                               method=sampling, spread=spread, engine=sensitivity_engine,
+                                               directions=directions, **options)
+            samples_text = f"{n_samples:_}".replace("_", ".")
+            varied = "pesi e punteggi" if pairwise is None else "punteggi"
+            st.write(f"Su {samples_text} simulazioni con {varied} variati, "
+                     f"ecco quante volte ogni {one} risulta la migliore:")
+            st.dataframe(pd.DataFrame({"Probabilità di essere prima": probabilities}, index=names)
+                         .sort_values("Probabilità di essere prima", ascending=False)
+                         .style.format("{:.1%}"))
+            flip = None if pairwise is not None else minimal_flip(
+                weight_vector, score_array, engine=sensitivity_engine, directions=directions)
+            if pairwise is not None:
+                st.write("Con AHP i pesi dei fattori vengono dai confronti a coppie: "
+                         "per cambiare la classifica bisogna rivederli.")
+            elif flip is None:
+                st.write(f"Nessuna modifica di un singolo peso può cambiare la {one} migliore.")
+            else:
+                st.write(f"Basterebbe portare il peso di **{factors[flip.factor]}** da {flip.old_weight} "
+                         f"a {flip.new_weight} perché **{names[flip.challenger]}** superi {winner}.")
 
-            # Usa ExcelWriter per creare un foglio che include una sezione info con il nome utente
-            with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-                # Scrivi le informazioni dell'utente nella prima parte (es. riga 0)
-                info_df = pd.DataFrame([f"Utente: {st.session_state.user_name}"])
-                info_df.to_excel(writer, index=False, header=False, startrow=0)
-                # Scrivi la matrice decisionale a partire dalla riga 3
-                df_display.to_excel(writer, startrow=3, index=True)
+            # Salva l'invio nell'archivio, interrogabile per catalogo: uno per sessione,
+            # premere di nuovo il bottone sostituisce quello precedente
+            run.phase("export")
+            get_store().add(Submission(st.session_state.user_name, catalog.id, tuple(factors), tuple(names),
+                                       matrix.weights.copy(), matrix.scores.copy(),
+                                       rater=st.session_state.session_id))
 
-            excel_buffer.seek(0)  # Torna all'inizio del buffer
+            # Genera il file Excel in memoria con il nome dell'utente in alto e la riga "Totale".
+            # Il risultato è in cache sul contenuto: stessi dati, stessi bytes senza rigenerarli
+            excel_bytes = build_export(st.session_state.user_name, factors, names,
+                                       weight_vector, score_array, fmt="xlsx")
+            excel_name, excel_mime = FORMATS["xlsx"]
 
             st.download_button(
                 label="Scarica i risultati come Excel",
-                data=excel_buffer,
-                file_name='decision_matrix_results.xlsx',
-                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                data=excel_bytes,
+                file_name=excel_name,
+                mime=excel_mime
+            )
+            csv_name, csv_mime = FORMATS["csv"]
+            st.download_button(
+                label="Scarica i risultati come CSV",
+                data=build_export(st.session_state.user_name, factors, names,
+                                  weight_vector, score_array, fmt="csv"),
+                file_name=csv_name,
+                mime=csv_mime
             )
 
-            # Invia il file Excel via Telegram al bot
-            bot_token = st.secrets.telegram.bot_token  # Token dal file secrets
+            run.phase("delivery")
+            # Accoda il file Excel per l'invio via Telegram al bot: l'invio vero e proprio
+            # avviene in background, qui ci limitiamo a registrarlo nella coda su disco.
+            # Download e Telegram condividono gli stessi bytes, senza copie intermedie
             chat_id = st.secrets.telegram.chat_id          # Chat ID dal file secrets
-            telegram_url = f"https://api.telegram.org/bot{bot_token}/sendDocument"
-            files = {"document": ("decision_matrix_results.xlsx", excel_buffer.getvalue(),
-                                  "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
-            data_payload = {"chat_id": chat_id}
-            response = requests.post(telegram_url, data=data_payload, files=files)
-            if response.status_code == 200:
-                st.success("Dati generati correttamente!")
-            else:
-                st.error("Errore nell'invio del file Excel a Telegram.")
+            st.session_state.telegram_message_id = get_outbox().enqueue(
+                chat_id, excel_name, excel_bytes, excel_mime
+            )
+
+        # Stato dell'ultimo invio a Telegram, aggiornato a ogni rerun
+        if "telegram_message_id" in st.session_state:
+            if run.current_phase != "delivery":
+                run.phase("delivery")
+            show_delivery_status(st.session_state.telegram_message_id)
+
+def main():
+    get_metrics_server()
+    # Tempi di ogni rerun per fase; con DECISION_MATRIX_PROFILING=1 il profilo completo
+    # di una sessione si attiva aprendo l'app con ?profile=1
+    session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex[:12])
+    profile = PROFILING_ENABLED and st.query_params.get("profile") == "1"
+    with script_run(session_id, profile=profile) as run:
+        app(run)
 
 if __name__ == "__main__":
     main()
 
-# import pandas as pd
-# import streamlit as st
-# import requests
-# import io  # per gestire file in memoria
-#
-# def main():
-#     # Inizializza lo stato della sessione per abilitare il modulo
-#     if "proceed" not in st.session_state:
-#         st.session_state.proceed = False
-#
-#     # Schermata iniziale per il benvenuto e la richiesta del nome
-#     st.title("Benvenuto nella Decision Matrix")
-#     user_name = st.text_input("Inserisci il tuo nome (es. Teo):", "")
-#
-#     if st.button("Inizia"):
-#         if user_name.strip() == "":
-#             st.error("Per favore, inserisci il tuo nome!")
-#         else:
-#             st.session_state.proceed = True
-#             st.session_state.user_name = user_name
-#
-#     # Se l'utente ha cliccato "Inizia", mostra il modulo completo
-#     if st.session_state.proceed:
-#         st.title("Decision Matrix per la scelta della casa della nonna Manu e nipotazzi")
-#         st.subheader("Istruzioni: assegna un peso (1-10) a ciascun fattore e poi valuta le case.")
-#
-#         # Personalizza i nomi delle case (i "fogli" che avranno casa loro)
-#         st.header("Personalizza i nomi delle case")
-#         casa_a_nome = st.text_input("Nome per Casa A (es. 'Casa Centro')", "Casa A")
-#         casa_b_nome = st.text_input("Nome per Casa B (es. 'Casa Villetta')", "Casa B")
-#         casa_c_nome = st.text_input("Nome per Casa C (es. 'Casa Parco')", "Casa C")
-#         alternatives = [casa_a_nome, casa_b_nome, casa_c_nome]
-#
-#         # Lista di fattori: rimosso "Costo dell'assicurazione" e aggiunti nuovi fattori
-#         factors = [
-#             "Prezzo",
-#             "Distanza dalla scuola",
-#             "Vicinanza ai trasporti pubblici",
-#             "Sicurezza del quartiere",
-#             "Numero di camere",
-#             "Spazio esterno",
-#             "Condizioni della casa",
-#             "Anno di costruzione",
-#             "Costi di manutenzione",
-#             "Prossimità a servizi essenziali (supermercato, ospedale)",
-#             "Qualità della scuola nel quartiere",
-#             "Accessibilità ai servizi",
-#             "Tranquillità della zona",
-#             "Valore di rivendita",
-#             "Facilità di finanziamento",
-#             "Disponibilità di parcheggio",
-#             "Dimensione complessiva",
-#             "Livello di inquinamento",
-#             "Vicino a spazi verdi",
-#             "Parere dei figli",
-#             "Costi d'ingresso",
-#             "Numero di bagni",                   # Nuovo fattore 1
-#             "Quanto piace alla nonna Manu",      # Nuovo fattore 2
-#             "Quanto piace al nonno",              # Nuovo fattore 3
-#             "Come sarà la casa tra 10 anni?",      # Nuovo fattore 4
-#             "Facilità di rivendita futura",        # Nuovo fattore 5
-#             "Presenza ascensore",                  # Nuovo fattore 6
-#             "Piano dell'appartamento",             # Nuovo fattore 7
-#             "Vista",                               # Nuovo fattore 8
-#             "Presenza di balcone e terrazzo",      # Nuovo fattore 9
-#             "Presenza di giardino privato o condominiale"  # Nuovo fattore 10
-#         ]
-#
-#         st.header("Assegna pesi ai fattori")
-#         st.write("Indica l'importanza di ciascun fattore (1 = meno importante, 10 = importantissimo)")
-#         weights = {}
-#         for factor in factors:
-#             weights[factor] = st.slider(f"Peso per '{factor}'", 1, 10, 1)
-#
-#         # Scegli il metodo di valutazione
-#         st.header("Metodo di valutazione")
-#         evaluation_method = st.radio(
-#             "Come preferisci valutare le case?",
-#             ["Valuta un fattore alla volta per tutte le case", "Valuta una casa alla volta per tutti i fattori"]
-#         )
-#
-#         data = {alt: [0] * len(factors) for alt in alternatives}
-#
-#         # Testo unificato per il fattore "Come sarà la casa tra 10 anni?"
-#         casa10_info = (" (Considera: dimensioni, flessibilità degli spazi, possibilità di modifiche future, "
-#                        "e pensa a chi abiterà la casa in futuro (es. chi resterà, chi andrà all'università o vivrà altrove e tornerà nel weekend); "
-#                        "punteggio basso se troppo grande o troppo piccolo)")
-#
-#         st.header("Valutazione delle case")
-#         if evaluation_method == "Valuta un fattore alla volta per tutte le case":
-#             for i, factor in enumerate(factors):
-#                 extra_info = ""
-#                 if factor.strip().lower() == "come sarà la casa tra 10 anni?".lower():
-#                     extra_info = casa10_info
-#                 elif factor == "Facilità di rivendita futura":
-#                     extra_info = " (Considera: ubicazione, trend di mercato, vicinanza a servizi e attrattiva per futuri acquirenti)"
-#                 st.subheader(f"Valutazione per '{factor}'")
-#                 st.write(f"Assegna un punteggio da 1 a 10 per ciascuna casa rispetto a '{factor}'{extra_info}")
-#
-#                 cols = st.columns(3)
-#                 for j, alt in enumerate(alternatives):
-#                     with cols[j]:
-#                         data[alt][i] = st.slider(f"{alt}", 1, 10, 1, key=f"{factor}_{alt}")
-#         else:
-#             for alt in alternatives:
-#                 st.subheader(f"Valutazione per {alt}")
-#                 st.write(f"Assegna un punteggio da 1 a 10 per {alt} rispetto a ciascun fattore")
-#                 for i, factor in enumerate(factors):
-#                     extra_info = ""
-#                     if factor.strip().lower() == "come sarà la casa tra 10 anni?".lower():
-#                         extra_info = casa10_info
-#                     elif factor == "Facilità di rivendita futura":
-#                         extra_info = " (Considera: ubicazione, stato di conservazione, vicinanza a servizi e attrattiva per futuri acquirenti)"
-#                     data[alt][i] = st.slider(f"'{factor}'{extra_info}", 1, 10, 1, key=f"{alt}_{factor}")
-#
-#         # Bottone per mostrare i risultati
-#         if st.button("MOSTRA I RISULTATI", key="show_results"):
-#             # Calcolo dei punteggi ponderati
-#             df = pd.DataFrame(data, index=factors)
-#             weighted_scores = {}
-#             weight_series = pd.Series(weights)
-#             for alt in alternatives:
-#                 weighted_sum = sum(df[alt][i] * weight_series[factor] for i, factor in enumerate(factors))
-#                 weighted_scores[alt] = weighted_sum
-#
-#             ranking = sorted(weighted_scores.items(), key=lambda x: x[1], reverse=True)
-#
-#             st.header("Risultati")
-#             df_display = df.copy()
-#             df_display.insert(0, "Peso", weight_series)
-#
-#             st.subheader("Matrice Decisionale")
-#             st.dataframe(df_display)
-#
-#             st.subheader("Punteggi Ponderati")
-#             weighted_df = pd.DataFrame({
-#                 'Alternativa': [alt for alt, _ in weighted_scores.items()],
-#                 'Punteggio': [score for _, score in weighted_scores.items()]
-#             })
-#             weighted_df = weighted_df.sort_values('Punteggio', ascending=False)
-#             st.dataframe(weighted_df)
-#
-#             st.subheader("Classifica delle Alternative")
-#             for i, (alt, score) in enumerate(ranking, start=1):
-#                 st.write(f"{i}. **{alt}** - punteggio: {score:.2f}")
-#
-#             st.subheader("Grafico comparativo")
-#             st.bar_chart(weighted_df.set_index('Alternativa'))
-#
-#             winner = ranking[0][0]
-#             st.subheader(f"Perché {winner} è la scelta migliore")
-#
-#             top_factors = []
-#             for factor in factors:
-#                 factor_score = df[winner][factors.index(factor)] * weights[factor]
-#                 top_factors.append((factor, factor_score))
-#             top_factors.sort(key=lambda x: x[1], reverse=True)
-#
-#             st.write("Punti di forza:")
-#             for factor, score in top_factors[:3]:
-#                 st.write(f"- **{factor}**: punteggio {df[winner][factors.index(factor)]}/10 × peso {weights[factor]} = {score:.1f} punti")
-#
-#             # Genera il file Excel in memoria con il nome dell'utente in alto
-#             excel_buffer = io.BytesIO()
-#
-#             # Aggiungi una riga "Totale" al dataframe, con i punteggi totali per ogni alternativa.
-#             # Lascia vuota la colonna "Peso"
-#             totals = [weighted_scores[alt] for alt in alternatives]
-#             df_display.loc["Totale"] = [""] + totals
-#
-#             # Usa ExcelWriter per creare un foglio che include una sezione info con il nome utente
-#             with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-#                 # Scrivi le informazioni dell'utente nella prima parte (es. riga 0)
-#                 info_df = pd.DataFrame([f"Utente: {st.session_state.user_name}"])
-#                 info_df.to_excel(writer, index=False, header=False, startrow=0)
-#                 # Scrivi la matrice decisionale a partire dalla riga 3
-#                 df_display.to_excel(writer, startrow=3, index=True)
-#
-#             excel_buffer.seek(0)  # Torna all'inizio del buffer
-#
-#             st.download_button(
-#                 label="Scarica i risultati come Excel",
-#                 data=excel_buffer,
-#                 file_name='decision_matrix_results.xlsx',
-#                 mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-#             )
-#
-#             # Invia il file Excel via Telegram al bot
-#             bot_token = st.secrets.telegram.bot_token  # Token dal file secrets
-#             chat_id = st.secrets.telegram.chat_id          # Chat ID dal file secrets
-#             telegram_url = f"https://api.telegram.org/bot{bot_token}/sendDocument"
-#             files = {"document": ("decision_matrix_results.xlsx", excel_buffer.getvalue(),
-#                                   "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
-#             data_payload = {"chat_id": chat_id}
-#             response = requests.post(telegram_url, data=data_payload, files=files)
-#             if response.status_code == 200:
-#                 st.success("Dati generati correttamente!")
-#             else:
-#                 st.error("Errore nell'invio del file Excel a Telegram.")
-#
-# if __name__ == "__main__":
-#     main()
@@ -0,0 +1,73 @@
+"""Calcolo dei punteggi ponderati della Decision Matrix, senza dipendenze dalla UI.
+
+I pesi sono un vettore di lunghezza F (uno per fattore) e i punteggi una matrice
+F x A (fattori x alternative), lo stesso orientamento del DataFrame mostrato in
+``sceltacasa.main()``.
+"""
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+
+def check_shapes(weights, scores, batch=False, expected=None):
+    """Verifica che pesi (F,) e punteggi (F, A) siano compatibili; con ``batch`` pesi
+    (M, F) e punteggi (M, F, A). ``expected`` è il (F, A) richiesto, se noto."""
+    ndim = 2 if batch else 1
+    if (weights.ndim != ndim or scores.ndim != ndim + 1 or scores.shape[:ndim] != weights.shape
+            or (expected is not None and scores.shape[ndim - 1:] != tuple(expected))):
+        raise ValueError(f"Dimensioni incompatibili: pesi {weights.shape}, punteggi {scores.shape}")
+
+
+class ScoringResult(NamedTuple):
+    totals: np.ndarray         # (A,) punteggio totale di ciascuna alternativa
+    ranking: np.ndarray        # indici delle alternative, dalla migliore alla peggiore
+    contributions: np.ndarray  # (F, A) punteggio x peso per ogni cella
+
+
+def top_k(values, k=None):
+    """Indici dei ``k`` valori più alti, in ordine decrescente.
+
+    A parità di valore vince l'indice più basso, come con ``sorted(..., reverse=True)``.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[0]
+    if k is None or k >= n:
+        return np.argsort(-values, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    # argpartition trova la soglia del k-esimo valore in O(n); solo i candidati
+    # sopra la soglia vengono ordinati, in modo stabile per gestire i pari merito
+    threshold = values[np.argpartition(values, n - k)[n - k]]
+    candidates = np.flatnonzero(values >= threshold)
+    order = np.argsort(-values[candidates], kind="stable")
+    return candidates[order[:k]]
+
+
+def score_matrix(weights, scores, k: Optional[int] = None) -> ScoringResult:
+    """Calcola totali, classifica e contributi per fattore con un solo prodotto matrice-vettore."""
+    weights = np.ascontiguousarray(weights)
+    scores = np.ascontiguousarray(scores)
+    check_shapes(weights, scores)
+
+    totals = weights @ scores
+    contributions = scores * weights[:, np.newaxis]
+    return ScoringResult(totals, top_k(totals, k), contributions)
+
+
+class BatchScoringResult(NamedTuple):
+    totals: np.ndarray   # (M, A) punteggio totale per matrice e alternativa
+    ranking: np.ndarray  # (M, A) indici delle alternative, dalla migliore alla peggiore
+
+
+def score_batch(weights, scores) -> BatchScoringResult:
+    """Versione a lotti di ``score_matrix``: pesi (M, F) e punteggi (M, F, A).
+
+    Matrici con meno fattori possono essere accodate con peso 0, che non altera i totali.
+    """
+    weights = np.ascontiguousarray(weights, dtype=np.float64)
+    scores = np.ascontiguousarray(scores, dtype=np.float64)
+    check_shapes(weights, scores, batch=True)
+
+    totals = np.matmul(weights[:, np.newaxis, :], scores)[:, 0, :]
+    ranking = np.argsort(-totals, axis=1, kind="stable")
+    return BatchScoringResult(totals, ranking)
@@ -0,0 +1,163 @@
+"""Analisi di sensibilità del vincitore rispetto all'incertezza su pesi e punteggi.
+
+``rank_probabilities`` ripete il calcolo dei punteggi ponderati su molti campioni in
+cui pesi e punteggi sono perturbati (±k, oppure pesi estratti da una Dirichlet
+centrata sui pesi scelti) e conta quante volte ogni alternativa arriva prima.
+I campioni sono elaborati a blocchi di dimensione limitata, interamente in NumPy;
+per numeri di campioni molto grandi i blocchi possono essere distribuiti su più
+processi.
+
+``minimal_flip`` trova invece la più piccola modifica di un singolo peso che
+cambierebbe il vincitore.
+
+Entrambe usano la somma ponderata, oppure il motore di ``engines.py`` indicato con
+``engine`` (con le direzioni dei fattori e le sue opzioni, es. ``pairwise`` per AHP),
+così che l'analisi riguardi la stessa classifica mostrata all'utente.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from decision_matrix import MAX_VALUE, MIN_VALUE
+from scoring import check_shapes
+
+METHODS = ("uniform", "dirichlet")
+
+# Elementi (campioni x fattori x alternative) generati al massimo per ogni blocco
+MAX_CHUNK_ELEMENTS = 4_000_000
+
+
+class FlipResult(NamedTuple):
+    factor: int       # indice del fattore da modificare
+    challenger: int   # alternativa che diventerebbe prima
+    old_weight: int
+    new_weight: int
+
+
+def _sample_totals(weights, scores, engine, directions, options):
+    # Punteggi (S, A) dei campioni: pesi (S, F), punteggi (F, A) oppure (S, F, A)
+    if engine is None:
+        if scores.ndim == 3:
+            return np.einsum("sf,sfa->sa", weights, scores)
+        return weights @ scores
+    scores = np.broadcast_to(scores, (len(weights),) + scores.shape[-2:])
+    return engine.totals(weights, scores, directions, **options)
+
+
+def _winner_counts(weights, scores, n_samples, method, spread, concentration, perturb_scores, seed,
+                   engine=None, directions=None, options=None):
+    rng = np.random.default_rng(seed)
+    n_factors, n_alternatives = scores.shape
+    chunk = max(1, MAX_CHUNK_ELEMENTS // (n_factors * n_alternatives))
+    counts = np.zeros(n_alternatives, dtype=np.int64)
+    weights = weights.astype(np.float64)
+    scores = scores.astype(np.float64)
+
+    for start in range(0, n_samples, chunk):
+        size = min(chunk, n_samples - start)
+        if method == "dirichlet":
+            # Pesi con la stessa somma di quelli scelti, più concentrati attorno ad essi
+            # al crescere di ``concentration``
+            sampled_weights = rng.dirichlet(weights * concentration, size) * weights.sum()
+        else:
+            noise = rng.integers(-spread, spread + 1, (size, n_factors))
+            sampled_weights = np.clip(weights + noise, MIN_VALUE, MAX_VALUE)
+        if perturb_scores and spread:
+            noise = rng.integers(-spread, spread + 1, (size, n_factors, n_alternatives))
+            sampled_scores = np.clip(scores + noise, MIN_VALUE, MAX_VALUE)
+        else:
+            sampled_scores = scores
+        totals = _sample_totals(sampled_weights, sampled_scores, engine, directions, options or {})
+        # A parità vince l'alternativa con indice più basso, come nella classifica normale
+        counts += np.bincount(np.argmax(totals, axis=1), minlength=n_alternatives)
+    return counts
+
+
+def rank_probabilities(weights, scores, n_samples=100_000, method="uniform", spread=1,
+                       concentration=20.0, perturb_scores=True, seed=None, processes=None,
+                       engine=None, directions=None, **options):
+    """Probabilità (A,) che ogni alternativa risulti prima.
+
+    ``method="uniform"`` somma a pesi e punteggi un intero casuale in [-spread, spread];
+    ``method="dirichlet"`` estrae i pesi da una Dirichlet centrata sui pesi scelti.
+    Con ``processes`` > 1 i campioni sono divisi tra più processi. Con ``engine`` i
+    campioni sono valutati da quel motore invece che dalla somma ponderata.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Metodo sconosciuto: {method!r} (ammessi: {', '.join(METHODS)})")
+    weights = np.ascontiguousarray(weights)
+    scores = np.ascontiguousarray(scores)
+    check_shapes(weights, scores)
+
+    args = (method, spread, concentration, perturb_scores)
+    extra = (engine, directions, options)
+    if not processes or processes <= 1:
+        counts = _winner_counts(weights, scores, n_samples, *args, seed, *extra)
+    else:
+        # Ogni processo ha un generatore indipendente derivato dallo stesso seme
+        seeds = np.random.SeedSequence(seed).spawn(processes)
+        shares = [n_samples // processes + (i < n_samples % processes) for i in range(processes)]
+        with ProcessPoolExecutor(processes) as pool:
+            futures = [pool.submit(_winner_counts, weights, scores, share, *args, child, *extra)
+                       for share, child in zip(shares, seeds)]
+            counts = sum(future.result() for future in futures)
+    return counts / n_samples
+
+
+def minimal_flip(weights, scores, engine=None, directions=None, **options):
+    """Più piccola variazione di un solo peso (entro 1-10) che cambia il vincitore.
+
+    Restituisce ``None`` se nessuna variazione di un singolo peso basta.
+    """
+    weights = np.asarray(weights, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.int64)
+    if engine is not None:
+        return _engine_flip(weights, scores, engine, directions, options)
+    totals = weights @ scores
+    n_alternatives = len(totals)
+    winner = int(np.argmax(totals))
+
+    # Di quanto cambia (vincitore - sfidante) per ogni punto di peso sul fattore f: (F, A)
+    gap = scores[:, [winner]] - scores
+    margin = totals[winner] - totals  # (A,)
+    # Lo sfidante vince anche a pari punteggio se viene prima nell'elenco
+    strict = np.arange(n_alternatives) > winner
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        steps = margin / np.abs(gap)
+        steps = np.where(strict, np.floor(steps) + 1, np.ceil(steps))
+        # Se gap > 0 il peso va diminuito, se gap < 0 aumentato; gap == 0 non serve a nulla
+        new_weights = weights[:, np.newaxis] - np.sign(gap) * np.where(gap != 0, steps, 0)
+    feasible = (gap != 0) & (new_weights >= MIN_VALUE) & (new_weights <= MAX_VALUE)
+    feasible[:, winner] = False
+    if not feasible.any():
+        return None
+
+    cost = np.where(feasible, steps, np.inf)
+    factor, challenger = np.unravel_index(np.argmin(cost), cost.shape)
+    new_weight = int(new_weights[factor, challenger])
+    # La stessa modifica può far superare il vincitore anche da un'altra alternativa
+    changed = weights.copy()
+    changed[factor] = new_weight
+    return FlipResult(int(factor), int(np.argmax(changed @ scores)), int(weights[factor]), new_weight)
+
+
+def _engine_flip(weights, scores, engine, directions, options):
+    # Motori non lineari: si provano tutti i pesi 1-10 di ogni fattore in un unico lotto
+    n_factors = len(weights)
+    values = np.arange(MIN_VALUE, MAX_VALUE + 1)
+    candidates = np.repeat(weights[np.newaxis], n_factors * len(values), axis=0)
+    factor_index = np.repeat(np.arange(n_factors), len(values))
+    candidates[np.arange(len(candidates)), factor_index] = np.tile(values, n_factors)
+
+    totals = _sample_totals(np.vstack([weights, candidates]), scores, engine, directions, options)
+    winner = int(np.argmax(totals[0]))
+    winners = np.argmax(totals[1:], axis=1)
+    steps = np.abs(candidates[np.arange(len(candidates)), factor_index] - weights[factor_index])
+    cost = np.where(winners != winner, steps, np.inf)
+    if not np.isfinite(cost).any():
+        return None
+    best = int(np.argmin(cost))
+    factor = int(factor_index[best])
+    return FlipResult(factor, int(winners[best]), int(weights[factor]), int(candidates[best, factor]))
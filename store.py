@@ -0,0 +1,205 @@
+"""Archivio persistente delle matrici inviate, su SQLite in modalità WAL.
+
+Ogni invio (nome utente, catalogo, fattori, alternative, pesi, punteggi, data) viene
+salvato in una tabella indicizzata per catalogo. Se l'invio indica chi lo ha fatto
+(``rater``, es. la sessione dell'app), per ogni valutatore e catalogo resta solo
+l'ultimo: un nuovo invio sostituisce il precedente e prende un nuovo id.
+
+Le scritture sono accodate in memoria e scritte a blocchi con ``executemany`` da un
+thread in background; le letture svuotano prima la coda, quindi vedono sempre tutti
+gli invii già registrati.
+
+Le connessioni vengono prese da un piccolo pool condiviso: Streamlit esegue ogni
+sessione in un thread diverso e una connessione SQLite non va usata da due thread
+contemporaneamente.
+"""
+import atexit
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from scoring import check_shapes
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    user_name TEXT NOT NULL,
+    catalog TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    factors TEXT NOT NULL,
+    alternatives TEXT NOT NULL,
+    weights BLOB NOT NULL,
+    scores BLOB NOT NULL,
+    rater TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS submissions_catalog ON submissions (catalog, id);
+"""
+
+# Creato dopo l'eventuale aggiunta della colonna agli archivi esistenti
+_RATER_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS submissions_rater ON submissions (catalog, rater) WHERE rater != '';
+"""
+
+
+class Submission(NamedTuple):
+    user_name: str
+    catalog: str
+    factors: Tuple[str, ...]
+    alternatives: Tuple[str, ...]
+    weights: np.ndarray  # (F,) int8
+    scores: np.ndarray   # (F, A) int8
+    created_at: float = 0.0
+    id: Optional[int] = None
+    rater: str = ""  # chi ha fatto l'invio; vuoto se sconosciuto (nessuna deduplicazione)
+
+
+def _to_row(submission):
+    weights = np.ascontiguousarray(submission.weights, dtype=np.int8)
+    scores = np.ascontiguousarray(submission.scores, dtype=np.int8)
+    check_shapes(weights, scores, expected=(len(submission.factors), len(submission.alternatives)))
+    return (submission.user_name, submission.catalog, submission.created_at or time.time(),
+            json.dumps(list(submission.factors), ensure_ascii=False),
+            json.dumps(list(submission.alternatives), ensure_ascii=False),
+            weights.tobytes(), scores.tobytes(), submission.rater)
+
+
+def _from_row(row):
+    submission_id, user_name, catalog, created_at, factors, alternatives, weights, scores, rater = row
+    factors = tuple(json.loads(factors))
+    alternatives = tuple(json.loads(alternatives))
+    return Submission(
+        user_name, catalog, factors, alternatives,
+        np.frombuffer(weights, dtype=np.int8),
+        np.frombuffer(scores, dtype=np.int8).reshape(len(factors), len(alternatives)),
+        created_at, submission_id, rater,
+    )
+
+
+class SubmissionStore:
+    def __init__(self, path="submissions.sqlite3", pool_size=4, batch_size=100, flush_interval=1.0):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        with self.connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(submissions)")}
+            if "rater" not in columns:
+                conn.execute("ALTER TABLE submissions ADD COLUMN rater TEXT NOT NULL DEFAULT ''")
+            conn.executescript(_RATER_INDEX)
+        self._flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,),
+                                         name="submission-store-flush", daemon=True)
+        self._flusher.start()
+        # Gli invii ancora in coda vengono scritti anche se il processo termina
+        atexit.register(self.flush)
+
+    @contextmanager
+    def connection(self):
+        """Presta una connessione del pool, creandola se il pool è vuoto."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            yield conn
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def add(self, submission):
+        """Accoda un invio; viene scritto entro ``flush_interval`` secondi o al prossimo blocco pieno.
+
+        Sostituisce l'invio precedente dello stesso ``rater`` per lo stesso catalogo.
+        """
+        row = _to_row(submission)
+        with self._pending_lock:
+            self._pending.append(row)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def add_many(self, submissions):
+        rows = [_to_row(submission) for submission in submissions]
+        with self._pending_lock:
+            self._pending.extend(rows)
+        self.flush()
+
+    def flush(self):
+        """Scrive subito tutti gli invii in coda e restituisce quanti ne ha scritti."""
+        with self._write_lock:
+            with self._pending_lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            try:
+                with self.connection() as conn, conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO submissions"
+                        " (user_name, catalog, created_at, factors, alternatives, weights, scores, rater)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            except Exception:
+                # La transazione è annullata: gli invii tornano in testa alla coda
+                with self._pending_lock:
+                    self._pending[:0] = rows
+                raise
+            return len(rows)
+
+    def _flush_loop(self, interval):
+        while not self._closed:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Database bloccato o disco pieno: si riprova al giro successivo
+                log.exception("Scrittura degli invii in %s non riuscita", self.path)
+
+    def submissions(self, catalog=None, after_id=0, limit=None):
+        """Invii in ordine di arrivo, eventualmente di un solo catalogo e successivi a ``after_id``."""
+        self.flush()
+        query = ("SELECT id, user_name, catalog, created_at, factors, alternatives, weights, scores, rater"
+                 " FROM submissions WHERE id > ?")
+        params = [after_id]
+        if catalog is not None:
+            query += " AND catalog = ?"
+            params.append(catalog)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self.connection() as conn:
+            return [_from_row(row) for row in conn.execute(query, params)]
+
+    def counts(self):
+        """Numero di invii per catalogo."""
+        self.flush()
+        with self.connection() as conn:
+            return dict(conn.execute("SELECT catalog, COUNT(*) FROM submissions GROUP BY catalog"))
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,247 @@
+"""Consegna asincrona dei file a Telegram tramite una coda persistente su SQLite.
+
+La UI si limita a ``Outbox.enqueue()``; un thread in background (``TelegramSender``)
+invia i messaggi in attesa con una ``requests.Session`` condivisa, un timeout e
+ritentativi con backoff esponenziale. I messaggi sopravvivono al riavvio del processo
+e lo stesso file inviato due volte alla stessa chat viene accodato una volta sola.
+Dei messaggi inviati o abbandonati resta solo la riga con ``dedup_key``, senza il file.
+
+Più processi (o repliche dell'app) possono condividere lo stesso file: la presa in carico
+è un'unica ``UPDATE ... RETURNING`` in una transazione ``IMMEDIATE`` e vale per
+``claim_timeout`` secondi, dopo i quali un messaggio mai segnato come inviato o fallito
+(processo terminato durante l'invio) torna disponibile per chiunque.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+log = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    dedup_key TEXT NOT NULL UNIQUE,
+    chat_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    mime TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+class Outbox:
+    """Coda di uscita su disco. Ogni operazione apre una propria connessione,
+    quindi la stessa istanza può essere usata da più thread."""
+
+    def __init__(self, path="outbox.sqlite3", claim_timeout=900.0):
+        self.path = str(path)
+        # Deve superare il tempo per inviare un intero giro di claim_due(), timeout compresi
+        self.claim_timeout = claim_timeout
+        self.new_message = threading.Event()
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Archivi creati prima che i file inviati venissero cancellati
+            conn.execute("UPDATE outbox SET payload = X'' WHERE status IN (?, ?) AND length(payload) > 0",
+                         (SENT, FAILED))
+            conn.commit()
+
+    def _connect(self, isolation_level=""):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=isolation_level)
+
+    def release_claimed(self, message_ids):
+        """Rimette subito in coda messaggi presi in carico da questo processo e non inviati.
+
+        Non tocca quelli presi in carico da altri processi, che tornano disponibili
+        da soli quando scade ``claim_timeout``.
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("UPDATE outbox SET status = ?, next_attempt_at = ? WHERE id = ? AND status = ?",
+                             [(PENDING, time.time(), message_id, SENDING) for message_id in message_ids])
+
+    def enqueue(self, chat_id, filename, payload, mime):
+        """Accoda un documento e restituisce l'id del messaggio (lo stesso se già presente).
+
+        Un messaggio già abbandonato (``FAILED``) torna in coda con i tentativi azzerati.
+        """
+        payload = bytes(payload)  # nessuna copia se è già bytes
+        dedup_key = hashlib.sha256(f"{chat_id}\0{filename}\0".encode() + payload).hexdigest()
+        now = time.time()
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    "INSERT INTO outbox"
+                    " (dedup_key, chat_id, filename, mime, payload, status, next_attempt_at, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (dedup_key) DO UPDATE SET status = excluded.status, attempts = 0,"
+                    " next_attempt_at = excluded.next_attempt_at, last_error = NULL,"
+                    " payload = excluded.payload WHERE status = ?",
+                    (dedup_key, str(chat_id), filename, mime, payload, PENDING, now, now, FAILED),
+                )
+            message_id, = conn.execute(
+                "SELECT id FROM outbox WHERE dedup_key = ?", (dedup_key,)
+            ).fetchone()
+        self.new_message.set()
+        return message_id
+
+    def status(self, message_id):
+        """Restituisce (stato, tentativi, ultimo errore) oppure None se l'id non esiste."""
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT status, attempts, last_error FROM outbox WHERE id = ?", (message_id,)
+            ).fetchone()
+
+    def claim_due(self, limit=10):
+        """Prende in carico i messaggi pronti per un (nuovo) tentativo di invio.
+
+        Sono pronti anche quelli presi in carico più di ``claim_timeout`` secondi fa e
+        mai conclusi. Due processi non ricevono mai lo stesso messaggio.
+        """
+        now = time.time()
+        # BEGIN IMMEDIATE: il lock in scrittura si prende prima di leggere i messaggi pronti
+        with closing(self._connect("IMMEDIATE")) as conn:
+            with conn:
+                rows = conn.execute(
+                    "UPDATE outbox SET status = ?, next_attempt_at = ? WHERE id IN"
+                    " (SELECT id FROM outbox WHERE status IN (?, ?) AND next_attempt_at <= ?"
+                    "  ORDER BY next_attempt_at LIMIT ?)"
+                    " RETURNING id, chat_id, filename, mime, payload, attempts",
+                    (SENDING, now + self.claim_timeout, PENDING, SENDING, now, limit),
+                ).fetchall()
+        return sorted(rows)
+
+    def next_due_in(self):
+        """Secondi al prossimo messaggio da inviare, None se la coda è vuota."""
+        with closing(self._connect()) as conn:
+            due, = conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status IN (?, ?)", (PENDING, SENDING)
+            ).fetchone()
+        return None if due is None else max(0.0, due - time.time())
+
+    def mark_sent(self, message_id):
+        with closing(self._connect()) as conn, conn:
+            # Il file non serve più: la riga resta solo per la deduplicazione
+            conn.execute("UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = NULL,"
+                         " payload = X'' WHERE id = ?", (SENT, message_id))
+
+    def mark_failed(self, message_id, error, retry_in=None):
+        """Registra un tentativo fallito; senza ``retry_in`` il messaggio è abbandonato."""
+        with closing(self._connect()) as conn, conn:
+            if retry_in is None:
+                # Se lo stesso file viene accodato di nuovo, enqueue() rimette il contenuto
+                conn.execute("UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?,"
+                             " payload = X'' WHERE id = ?", (FAILED, error, message_id))
+            else:
+                conn.execute("UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?,"
+                             " next_attempt_at = ? WHERE id = ?",
+                             (PENDING, error, time.time() + retry_in, message_id))
+
+
+class TelegramSender(threading.Thread):
+    """Thread che svuota l'``Outbox`` verso l'API ``sendDocument`` di Telegram."""
+
+    def __init__(self, outbox, bot_token, api_url=TELEGRAM_API_URL, timeout=(5, 30),
+                 max_attempts=6, backoff_base=2.0, backoff_max=600.0):
+        super().__init__(name="telegram-sender", daemon=True)
+        self.outbox = outbox
+        self.url = f"{api_url.rstrip('/')}/bot{bot_token}/sendDocument"
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # requests serve solo al thread di invio: importarlo qui non rallenta l'avvio dell'app
+        import requests
+
+        self.session = requests.Session()
+        self._stopping = threading.Event()
+        self._claimed = set()  # id presi in carico e non ancora segnati come inviati o falliti
+
+    def backoff(self, attempts):
+        return min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+
+    def send(self, chat_id, filename, mime, payload):
+        """Invia un documento; restituisce None se riuscito, altrimenti (errore, attesa suggerita)."""
+        import requests
+
+        try:
+            response = self.session.post(
+                self.url, data={"chat_id": chat_id},
+                files={"document": (filename, payload, mime)}, timeout=self.timeout,
+            )
+        except requests.RequestException as exc:
+            return str(exc), None
+        if response.status_code == 200:
+            return None
+        retry_after = None
+        if response.status_code == 429:
+            # Telegram indica quanto attendere in caso di troppe richieste
+            try:
+                retry_after = float(response.json()["parameters"]["retry_after"])
+            except (ValueError, KeyError, TypeError):
+                pass
+        return f"HTTP {response.status_code}: {response.text[:200]}", retry_after
+
+    def process_due(self):
+        """Esegue un giro di invii e restituisce quanti messaggi ha preso in carico."""
+        rows = self.outbox.claim_due()
+        self._claimed.update(row[0] for row in rows)
+        for message_id, chat_id, filename, mime, payload, attempts in rows:
+            outcome = self.send(chat_id, filename, mime, payload)
+            if outcome is None:
+                self.outbox.mark_sent(message_id)
+            else:
+                error, retry_after = outcome
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    self.outbox.mark_failed(message_id, error)
+                else:
+                    self.outbox.mark_failed(message_id, error, retry_after or self.backoff(attempts))
+            self._claimed.discard(message_id)
+        return len(rows)
+
+    def run(self):
+        errors = 0
+        while not self._stopping.is_set():
+            try:
+                if self.process_due():
+                    errors = 0
+                    continue
+                self.outbox.new_message.clear()
+                wait = self.outbox.next_due_in()
+                errors = 0
+            except Exception:
+                # Database bloccato, disco pieno o errore imprevisto durante l'invio: il thread
+                # non deve fermarsi, riprova dopo un'attesa crescente
+                errors += 1
+                wait = self.backoff(errors)
+                log.exception("Errore nell'invio dei messaggi in coda, nuovo tentativo tra %.0f s", wait)
+                self._stopping.wait(wait)
+                try:
+                    self.outbox.release_claimed(self._claimed)
+                    self._claimed.clear()
+                except Exception:
+                    log.exception("Impossibile rimettere in coda i messaggi in invio")
+                continue
+            self.outbox.new_message.wait(self.backoff_max if wait is None else wait)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self.outbox.new_message.set()
+        self.join(timeout)
+        self.session.close()
@@ -0,0 +1,123 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from aggregation import CatalogAggregates, GroupAggregate
+from scoring import score_batch
+from store import Submission, SubmissionStore
+
+
+def random_group(seed, n_raters=15, n_factors=4, n_alternatives=4, high=3):
+    rng = np.random.default_rng(seed)
+    weights = rng.integers(1, high + 1, (n_raters, n_factors))
+    scores = rng.integers(1, high + 1, (n_raters, n_factors, n_alternatives))
+    group = GroupAggregate([f"F{i}" for i in range(n_factors)], [f"A{j}" for j in range(n_alternatives)],
+                           capacity=2)
+    group.add_many(weights[:5], scores[:5])
+    for k in range(5, n_raters):
+        group.add(weights[k], scores[k])
+    return group, weights, scores
+
+
+def agreement(order, pairwise):
+    return sum(pairwise[order[i], order[j]] for i in range(len(order)) for j in range(i + 1, len(order)))
+
+
+def test_borda_with_ties():
+    group = GroupAggregate(["Prezzo"], ["A", "B", "C"])
+    group.add([1], [[5, 5, 1]])  # A e B pari merito
+    group.add([1], [[1, 9, 9]])  # B e C pari merito
+    # A: 1.5 + 0, B: 1.5 + 1.5, C: 0 + 1.5
+    assert group.borda_points.tolist() == [1.5, 3.0, 1.5]
+    assert group.borda_ranking().tolist() == [1, 0, 2]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_kemeny_matches_brute_force(seed):
+    group, _, _ = random_group(seed, n_alternatives=5)
+    best = max(agreement(order, group.pairwise) for order in itertools.permutations(range(5)))
+    order = group.kemeny_ranking()
+    assert sorted(order.tolist()) == list(range(5))
+    assert agreement(order, group.pairwise) == best
+
+
+def test_statistics_match_numpy():
+    group, weights, scores = random_group(3, high=10)
+    totals = score_batch(weights, scores).totals
+    assert group.count == len(weights)
+    assert np.allclose(group.mean_totals(), totals.mean(axis=0))
+    assert np.allclose(group.median_totals(), np.median(totals, axis=0))
+    weight_std, score_std = group.factor_dispersion()
+    assert np.allclose(weight_std, weights.std(axis=0))
+    assert np.allclose(score_std, scores.std(axis=0).mean(axis=1))
+    pairwise = (totals[:, :, None] > totals[:, None, :]).sum(axis=0)
+    assert np.array_equal(group.pairwise, pairwise)
+
+
+def test_remove_restores_running_sums():
+    group, weights, scores = random_group(4)
+    raters = [f"r{k}" for k in range(len(weights))]
+    tracked = GroupAggregate(group.factors, group.alternatives)
+    tracked.add_many(weights, scores, raters)
+    for rater in ("r0", "r7", "r14"):
+        assert tracked.remove(rater)
+    assert not tracked.remove("r7")
+
+    kept = [k for k in range(len(weights)) if raters[k] not in ("r0", "r7", "r14")]
+    fresh = GroupAggregate(group.factors, group.alternatives)
+    fresh.add_many(weights[kept], scores[kept])
+    assert tracked.count == fresh.count
+    for name in ("total_sum", "borda_points", "pairwise"):
+        assert np.array_equal(getattr(tracked, name), getattr(fresh, name))
+    assert np.allclose(tracked.factor_dispersion(), fresh.factor_dispersion())
+    assert np.array_equal(np.sort(tracked.totals, axis=0), np.sort(fresh.totals, axis=0))
+
+
+def test_each_rater_counted_once(tmp_path):
+    store = SubmissionStore(tmp_path / "s.sqlite3")
+    aggregates = CatalogAggregates("casa")
+
+    def send(rater, scores, alternatives=("A", "B")):
+        store.add(Submission(rater, "casa", ("Prezzo",), alternatives, np.array([2]), np.array([scores]),
+                             rater=rater))
+
+    send("uno", [9, 1])
+    send("due", [1, 9])
+    group, = aggregates.update(store).values()
+    assert group.count == 2
+
+    # "uno" cambia idea e invia di nuovo: resta un solo invio per valutatore
+    send("uno", [1, 9])
+    send("uno", [2, 9])
+    group, = aggregates.update(store).values()
+    assert group.count == 2
+    assert group.mean_totals().tolist() == [3.0, 18.0]
+    assert group.borda_points.tolist() == [0.0, 2.0]
+
+    # Cambiando le alternative l'invio passa a un altro gruppo; il gruppo vuoto sparisce
+    send("uno", [1, 2, 3], ("A", "B", "C"))
+    send("due", [3, 2, 1], ("A", "B", "C"))
+    groups = aggregates.update(store)
+    assert list(groups) == [(("Prezzo",), ("A", "B", "C"))]
+    assert groups[(("Prezzo",), ("A", "B", "C"))].count == 2
+    store.close()
+
+
+def test_incremental_update_matches_rebuild(tmp_path):
+    store = SubmissionStore(tmp_path / "s.sqlite3")
+    aggregates = CatalogAggregates("casa")
+    rng = np.random.default_rng(9)
+    for _ in range(8):
+        for _ in range(5):
+            rater = f"r{rng.integers(6)}"
+            store.add(Submission(rater, "casa", ("Prezzo", "Zona"), ("A", "B", "C"),
+                                 rng.integers(1, 11, 2), rng.integers(1, 11, (2, 3)), rater=rater))
+        aggregates.update(store)
+    group, = aggregates.groups.values()
+    rebuilt, = CatalogAggregates("casa").update(store).values()
+    assert group.count == rebuilt.count == len(store.submissions("casa"))
+    for name in ("total_sum", "borda_points", "pairwise"):
+        assert np.array_equal(getattr(group, name), getattr(rebuilt, name))
+    assert np.allclose(group.median_totals(), rebuilt.median_totals())
+    store.close()
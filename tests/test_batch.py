@@ -0,0 +1,107 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch
+from export import build_export
+from scoring import score_matrix
+
+
+def merged_exports(tmp_path):
+    # Due export CSV di persone diverse, con alternative diverse, uniti in un solo file
+    first = build_export("teo", ["Costo", "Rischio"], ["Casa A", "Casa B"],
+                         np.array([7, 4]), np.array([[3, 8], [6, 2]]), fmt="csv")
+    second = build_export("ada", ["Costo", "Rischio", "Zona"], ["Villa", "Casa A", "Loft"],
+                          np.array([5, 5, 2]), np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]]), fmt="csv")
+    path = tmp_path / "uniti.csv"
+    pd.concat([pd.read_csv(io.BytesIO(first)), pd.read_csv(io.BytesIO(second))],
+              ignore_index=True).to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("engine", ["weighted_sum", "normalized", "topsis", "ahp"])
+def test_missing_alternatives_are_left_out(tmp_path, engine):
+    output = tmp_path / "classifica.csv"
+    batch.run(merged_exports(tmp_path), output, chunksize=2, engine=engine)
+    ranking = pd.read_csv(output)
+    assert not ranking["Punteggio"].isna().any()
+    assert sorted(ranking[ranking["matrix_id"] == "teo"]["Strategia"]) == ["Casa A", "Casa B"]
+    assert sorted(ranking[ranking["matrix_id"] == "ada"]["Strategia"]) == ["Casa A", "Loft", "Villa"]
+    assert ranking["matrix_id"].tolist() == ["teo"] * 2 + ["ada"] * 3
+    if engine == "weighted_sum":
+        assert ranking["Punteggio"].tolist() == [64, 45, 63, 51, 39]
+
+
+def test_partially_missing_scores_are_rejected(tmp_path):
+    path = tmp_path / "incompleto.csv"
+    pd.DataFrame({"matrix_id": ["teo", "teo"], "Fattore": ["Costo", "Rischio"], "Peso": [7, 4],
+                  "A": [3, None], "B": [8, 2]}).to_csv(path, index=False)
+    with pytest.raises(ValueError, match="'A'"):
+        batch.run(path, tmp_path / "classifica.csv")
+
+
+def random_matrices(seed=0, count=12, n_alternatives=3):
+    rng = np.random.default_rng(seed)
+    alternatives = [f"Strategia {chr(65 + j)}" for j in range(n_alternatives)]
+    rows, matrices = [], {}
+    for m in range(count):
+        # Numero di fattori variabile: le matrici più corte vengono completate con peso 0
+        n_factors = int(rng.integers(1, 6))
+        weights = rng.integers(1, 11, n_factors)
+        scores = rng.integers(1, 11, (n_factors, n_alternatives))
+        matrices[f"m{m}"] = (weights, scores)
+        for i in range(n_factors):
+            rows.append({"matrix_id": f"m{m}", "Fattore": f"Fattore {i}", "Peso": weights[i],
+                         **dict(zip(alternatives, scores[i].tolist()))})
+    return pd.DataFrame(rows), matrices, alternatives
+
+
+def expected_ranking(matrices, alternatives):
+    rows = []
+    for matrix_id, (weights, scores) in matrices.items():
+        result = score_matrix(weights, scores)
+        for position, j in enumerate(result.ranking, start=1):
+            rows.append((matrix_id, position, alternatives[j], float(result.totals[j])))
+    return rows
+
+
+def test_iter_matrix_blocks_rejoins_split_matrices():
+    frame, matrices, _ = random_matrices()
+    for chunksize in (1, 2, 3, 7, len(frame)):
+        chunks = (frame.iloc[start:start + chunksize] for start in range(0, len(frame), chunksize))
+        blocks = list(batch.iter_matrix_blocks(chunks))
+        # Nessuna matrice divisa tra due blocchi e nessuna riga persa
+        ids = [set(block["matrix_id"]) for block in blocks]
+        assert sum(len(block_ids) for block_ids in ids) == len(matrices)
+        assert pd.concat(blocks).reset_index(drop=True).equals(frame)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+@pytest.mark.parametrize("chunksize", [1, 2, 3, 7, 1000])
+def test_chunked_run_matches_score_matrix(tmp_path, suffix, chunksize):
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    frame, matrices, alternatives = random_matrices()
+    path = tmp_path / f"matrici{suffix}"
+    if suffix == ".parquet":
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+    output = tmp_path / f"classifica{suffix}"
+
+    rows, count, _ = batch.run(path, output, chunksize=chunksize)
+    assert (rows, count) == (len(frame), len(matrices))
+    ranking = pd.read_parquet(output) if suffix == ".parquet" else pd.read_csv(output)
+    assert list(ranking.itertuples(index=False, name=None)) == expected_ranking(matrices, alternatives)
+
+
+@pytest.mark.parametrize("engine", ["normalized", "topsis", "ahp"])
+def test_chunking_does_not_change_other_engines(tmp_path, engine):
+    frame, _, _ = random_matrices(seed=1)
+    path = tmp_path / "matrici.csv"
+    frame.to_csv(path, index=False)
+    batch.run(path, tmp_path / "uno.csv", chunksize=len(frame), engine=engine)
+    batch.run(path, tmp_path / "blocchi.csv", chunksize=2, engine=engine)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "uno.csv"), pd.read_csv(tmp_path / "blocchi.csv"))
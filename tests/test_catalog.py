@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+import catalog
+from catalog import CATALOG_DIR, DEFAULT_CATALOG, catalog_paths, get_catalog, load_catalog
+from engines import BENEFIT, COST
+
+
+def write_catalog(path, **overrides):
+    raw = {
+        "title": "Decision Matrix di prova",
+        "factors": [{"name": "Costo", "direction": "cost"}, {"name": "Spazio"}],
+        **overrides,
+    }
+    # None toglie la chiave
+    raw = {key: value for key, value in raw.items() if value is not None}
+    path.write_text(json.dumps(raw), encoding="utf-8")
+    return path
+
+
+def test_defaults(tmp_path):
+    loaded = load_catalog(write_catalog(tmp_path / "prova.json"))
+    assert loaded.id == loaded.name == "prova"
+    assert loaded.alternative == "alternativa" and loaded.default_alternatives == ()
+    assert loaded.factor_names == ["Costo", "Spazio"]
+    assert loaded.directions == [COST, BENEFIT]
+
+
+def test_reloaded_only_when_mtime_changes(tmp_path, monkeypatch):
+    path = write_catalog(tmp_path / "prova.json")
+    stat = path.stat()
+    parsed = []
+    parse = catalog._parse
+    monkeypatch.setattr(catalog, "_parse", lambda p: parsed.append(p) or parse(p))
+
+    first = load_catalog(path)
+    assert load_catalog(path) is first and len(parsed) == 1
+
+    # Stesso mtime: il contenuto nuovo non viene letto
+    write_catalog(path, title="Titolo nuovo")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_catalog(path).title == "Decision Matrix di prova" and len(parsed) == 1
+
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert load_catalog(path).title == "Titolo nuovo" and len(parsed) == 2
+
+
+@pytest.mark.parametrize("overrides, message", [
+    ({"factors": [{"name": "Costo", "direction": "spesa"}]}, "direzioni sconosciute"),
+    ({"factors": [{"name": "Costo"}, {"name": "Costo", "direction": "cost"}]}, "fattori ripetuti"),
+    ({"factors": []}, "nessun fattore"),
+    ({"factors": [{"name": "Costo", "peso": 3}]}, "non valido"),
+    ({"title": None}, "'title'"),
+])
+def test_invalid_catalogs(tmp_path, overrides, message):
+    path = write_catalog(tmp_path / "prova.json", **overrides)
+    with pytest.raises(ValueError, match=message):
+        load_catalog(path)
+
+
+def test_catalog_paths(tmp_path):
+    write_catalog(tmp_path / "b.json")
+    write_catalog(tmp_path / "a.JSON")
+    (tmp_path / "c.yml").write_text("", encoding="utf-8")
+    (tmp_path / "note.txt").write_text("", encoding="utf-8")
+    paths = catalog_paths(tmp_path)
+    assert list(paths) == ["a", "b", "c"]
+    assert paths["b"] == tmp_path / "b.json"
+
+    assert get_catalog("b", tmp_path).id == "b"
+    with pytest.raises(KeyError, match="Catalogo sconosciuto"):
+        get_catalog("note", tmp_path)
+
+
+def test_shipped_catalogs_are_valid():
+    paths = catalog_paths(CATALOG_DIR)
+    assert DEFAULT_CATALOG in paths
+    for catalog_id in paths:
+        assert get_catalog(catalog_id).factors
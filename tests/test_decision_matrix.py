@@ -0,0 +1,22 @@
+import pytest
+
+from decision_matrix import DecisionMatrix
+
+
+@pytest.mark.parametrize("names,expected", [
+    (["A", "B", ""], ["A", "B", "Alternativa #3"]),
+    (["X", "X", "Y"], ["X (#1)", "X (#2)", "Y"]),
+    (["Alternativa #2", ""], ["Alternativa #2", "Alternativa #2 (#2)"]),
+    (["X", "X", "X (#2)"], ["X (#1)", "X (#2) (#2)", "X (#2)"]),
+    (["", "Alternativa #1 (#1)", "Alternativa #1"], ["Alternativa #1 (#1) (#1)", "Alternativa #1 (#1)", "Alternativa #1"]),
+])
+def test_alternative_labels_are_unique(names, expected):
+    labels = DecisionMatrix(["Prezzo"], names).alternative_labels()
+    assert labels == expected
+    assert len(set(labels)) == len(labels)
+
+
+def test_labels_follow_ids_after_removal():
+    matrix = DecisionMatrix(["Prezzo"], ["A", "A", ""])
+    matrix.remove_alternative(1)
+    assert matrix.alternative_labels() == ["A", "Alternativa #3"]
@@ -0,0 +1,46 @@
+import numpy as np
+
+from engines import pairwise_from_weights, reciprocal_pairwise
+
+
+def test_reciprocal_pairwise_uses_upper_triangle():
+    start = np.round(pairwise_from_weights([2, 4, 8]), 2)
+    edited = start.copy()
+    edited[0, 1] = 3.0
+    pairwise = reciprocal_pairwise(edited, start)
+    assert pairwise[0, 1] == 3.0 and pairwise[1, 0] == 1 / 3
+    assert np.allclose(pairwise * pairwise.T, 1.0)
+
+
+def test_lower_triangle_edit_is_mirrored():
+    start = np.ones((3, 3))
+    edited = start.copy()
+    edited[2, 0] = 4.0  # il terzo fattore è 4 volte più importante del primo
+    pairwise = reciprocal_pairwise(edited, start)
+    assert pairwise[0, 2] == 0.25 and pairwise[2, 0] == 4.0
+
+    # Se sono cambiate entrambe le celle conta quella sopra la diagonale
+    edited[0, 2] = 2.0
+    pairwise = reciprocal_pairwise(edited, start)
+    assert pairwise[0, 2] == 2.0 and pairwise[2, 0] == 0.5
+
+
+def test_empty_cells_fall_back_to_start():
+    start = np.round(pairwise_from_weights([1, 2]), 2)
+    edited = start.copy()
+    edited[0, 1] = np.nan
+    assert np.allclose(reciprocal_pairwise(edited, start), [[1.0, 0.5], [2.0, 1.0]])
+
+
+def test_ahp_single_pairwise_matches_stack():
+    from engines import ENGINES
+
+    rng = np.random.default_rng(5)
+    weights = rng.integers(1, 11, (20, 4))
+    scores = rng.integers(1, 11, (20, 4, 3))
+    pairwise = pairwise_from_weights([1, 3, 5, 2])
+    pairwise[0, 1], pairwise[1, 0] = 2.0, 0.5  # non perfettamente coerente
+    engine = ENGINES["ahp"]
+    stacked = np.broadcast_to(pairwise, (20, 4, 4))
+    assert np.allclose(engine.totals(weights, scores, pairwise=pairwise),
+                       engine.totals(weights, scores, pairwise=stacked))
@@ -0,0 +1,23 @@
+import numpy as np
+
+from export import build_export, content_hash
+
+
+def key(weights, scores):
+    return content_hash("Teo", ["Prezzo", "Zona"], ["A", "B"], weights, scores, "csv", None)
+
+
+def test_content_hash_distinguishes_float_values():
+    weights = np.array([3, 4])
+    scores = np.array([[1, 2], [5, 6]])
+    assert key(weights, scores) == key(weights.copy(), scores.copy())
+    assert key(weights + 0.4, scores) != key(weights, scores)
+    assert key(weights, scores + 0.4) != key(weights, scores)
+
+
+def test_cached_export_matches_values():
+    weights = np.array([3.0, 4.0])
+    scores = np.array([[1, 2], [5, 6]])
+    first = build_export("Teo", ["Prezzo", "Zona"], ["A", "B"], weights, scores, fmt="csv")
+    second = build_export("Teo", ["Prezzo", "Zona"], ["A", "B"], weights + 0.5, scores, fmt="csv")
+    assert first != second
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from importer import parse_rows
+
+
+def export_rows(alternatives, weights, scores, padding=0):
+    rows = [["Utente: Teo"], [], [], [None, "Peso", *alternatives] + [None] * padding]
+    for i, (weight, row) in enumerate(zip(weights, scores)):
+        rows.append([f"Fattore {i}", weight, *row] + [None] * padding)
+    totals = np.asarray(weights) @ np.asarray(scores)
+    rows.append(["Totale", None, *totals.tolist()] + [None] * padding)
+    return rows
+
+
+def test_trailing_empty_columns_are_ignored():
+    imported = parse_rows(export_rows(["A", "B"], [3, 4], [[1, 2], [5, 6]], padding=3))
+    assert imported.alternatives == ("A", "B")
+    assert imported.scores.tolist() == [[1, 2], [5, 6]]
+
+
+def test_unnamed_alternatives_keep_their_column():
+    # Gli export della prima versione lasciano vuoto il nome della terza strategia
+    imported = parse_rows(export_rows(["A", None, None], [3, 4], [[1, 2, 7], [5, 6, 8]]))
+    assert imported.alternatives == ("A", "Alternativa #2", "Alternativa #3")
+    assert imported.scores.tolist() == [[1, 2, 7], [5, 6, 8]]
+
+
+def test_numeric_alternative_names():
+    imported = parse_rows(export_rows([2024, "B"], [3], [[1, 2]]))
+    assert imported.alternatives == ("2024", "B")
+
+
+def test_wrong_totals_are_rejected():
+    rows = export_rows(["A", "B"], [3, 4], [[1, 2], [5, 6]])
+    rows[-1][2] += 1
+    with pytest.raises(ValueError, match="Totale"):
+        parse_rows(rows)
+
+
+def test_reimport_does_not_duplicate(tmp_path):
+    from export import build_export
+    from importer import load_directory
+    from store import SubmissionStore
+
+    exports = tmp_path / "export"
+    (exports / "copia").mkdir(parents=True)
+    for user_name, path in [("Teo", exports / "a.xlsx"), ("Ada", exports / "b.xlsx"),
+                            ("Teo", exports / "copia" / "a.xlsx")]:
+        path.write_bytes(build_export(user_name, ["Prezzo", "Zona"], ["A", "B"],
+                                      np.array([3, 4]), np.array([[1, 2], [5, 6]]), fmt="xlsx"))
+    store = SubmissionStore(tmp_path / "s.sqlite3")
+    try:
+        for _ in range(2):
+            imported, errors = load_directory(exports, store, processes=1)
+            assert len(imported) == 3 and not errors
+        assert sorted(s.user_name for s in store.submissions()) == ["Ada", "Teo"]
+    finally:
+        store.close()
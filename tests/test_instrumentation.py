@@ -0,0 +1,25 @@
+import urllib.request
+
+from instrumentation import Registry, ScriptRun, serve_metrics
+
+
+def test_phases_are_recorded_once():
+    registry = Registry()
+    run = ScriptRun("sessione", registry)
+    run.phase("delivery")
+    assert run.current_phase == "delivery"
+    run.finish()
+    assert run.current_phase is None
+    assert set(run.durations) == {"delivery", "total"}
+
+
+def test_metrics_server_listens_on_localhost():
+    server = serve_metrics(port=0)
+    try:
+        host, port = server.server_address[:2]
+        assert host == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert b"decision_matrix_phase_seconds" in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,82 @@
+"""Equivalenza di ``scoring`` con il ciclo dei risultati originale di ``sceltacasa.main()``."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from scoring import check_shapes, score_matrix, top_k
+
+
+def old_results(factors, alternatives, weights, data):
+    # Il codice di "MOSTRA I RISULTATI" prima della vettorizzazione
+    df = pd.DataFrame(data, index=factors)
+    weighted_scores = {}
+    weight_series = pd.Series(weights)
+    for alt in alternatives:
+        weighted_sum = sum(df[alt].iloc[i] * weight_series[factor] for i, factor in enumerate(factors))
+        weighted_scores[alt] = weighted_sum
+    ranking = sorted(weighted_scores.items(), key=lambda x: x[1], reverse=True)
+
+    winner = ranking[0][0]
+    top_factors = []
+    for factor in factors:
+        factor_score = df[winner].iloc[factors.index(factor)] * weights[factor]
+        top_factors.append((factor, factor_score))
+    top_factors.sort(key=lambda x: x[1], reverse=True)
+    return weighted_scores, ranking, top_factors[:3]
+
+
+def random_case(rng, n_factors, n_alternatives, high):
+    factors = [f"Fattore {i}" for i in range(n_factors)]
+    alternatives = [f"Strategia {chr(65 + j)}" for j in range(n_alternatives)]
+    weights = rng.integers(1, high + 1, n_factors)
+    scores = rng.integers(1, high + 1, (n_factors, n_alternatives))
+    return factors, alternatives, weights, scores
+
+
+# high=2 produce moltissimi pari merito, high=10 è la scala dell'app
+@pytest.mark.parametrize("high", [2, 3, 10])
+@pytest.mark.parametrize("n_factors,n_alternatives", [(1, 1), (1, 3), (3, 2), (13, 3), (31, 6)])
+def test_score_matrix_matches_old_loop(high, n_factors, n_alternatives):
+    rng = np.random.default_rng(1000 * high + 10 * n_factors + n_alternatives)
+    for _ in range(50):
+        factors, alternatives, weights, scores = random_case(rng, n_factors, n_alternatives, high)
+        data = {alt: scores[:, j].tolist() for j, alt in enumerate(alternatives)}
+        weighted_scores, ranking, top_factors = old_results(
+            factors, alternatives, dict(zip(factors, weights.tolist())), data)
+
+        result = score_matrix(weights, scores)
+        assert result.totals.tolist() == [weighted_scores[alt] for alt in alternatives]
+        assert [alternatives[j] for j in result.ranking] == [alt for alt, _ in ranking]
+
+        winner = result.ranking[0]
+        strengths = top_k(result.contributions[:, winner], 3)
+        assert [factors[i] for i in strengths] == [factor for factor, _ in top_factors]
+        assert result.contributions[strengths, winner].tolist() == [score for _, score in top_factors]
+
+
+def test_ties_keep_original_order():
+    weights = np.array([1, 1])
+    scores = np.array([[2, 5, 5], [3, 0, 0]])  # tutte e tre a 5
+    assert score_matrix(weights, scores).ranking.tolist() == [0, 1, 2]
+    assert top_k([4, 7, 7, 1, 7], 2).tolist() == [1, 2]
+    assert top_k([4, 7, 7, 1, 7], 3).tolist() == [1, 2, 4]
+
+
+def test_top_k_limits():
+    values = [3, 1, 2]
+    assert top_k(values).tolist() == [0, 2, 1]
+    assert top_k(values, 10).tolist() == [0, 2, 1]
+    assert top_k(values, 0).tolist() == []
+
+
+@pytest.mark.parametrize("weights, scores, options", [
+    ((3,), (4, 2), {}),
+    ((3,), (3,), {}),
+    ((3,), (3, 2), {"batch": True}),
+    ((5, 3), (5, 3, 2), {"batch": True, "expected": (3, 4)}),
+    ((3,), (3, 2), {"expected": (2, 3)}),
+])
+def test_incompatible_shapes(weights, scores, options):
+    with pytest.raises(ValueError, match="Dimensioni incompatibili"):
+        check_shapes(np.ones(weights), np.ones(scores), **options)
+    check_shapes(np.ones((2, 3)), np.ones((2, 3, 4)), batch=True, expected=(3, 4))
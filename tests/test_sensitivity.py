@@ -0,0 +1,43 @@
+import numpy as np
+
+from engines import COST, ENGINES
+from sensitivity import minimal_flip, rank_probabilities
+
+
+def test_weighted_sum_engine_matches_default():
+    rng = np.random.default_rng(7)
+    for _ in range(50):
+        weights = rng.integers(1, 11, 5)
+        scores = rng.integers(1, 11, (5, 3))
+        engine = ENGINES["weighted_sum"]
+        assert np.allclose(rank_probabilities(weights, scores, n_samples=2000, seed=1),
+                           rank_probabilities(weights, scores, n_samples=2000, seed=1, engine=engine))
+        flip, engine_flip = minimal_flip(weights, scores), minimal_flip(weights, scores, engine=engine)
+        assert (flip is None) == (engine_flip is None)
+        if flip is not None:
+            assert abs(flip.new_weight - flip.old_weight) == abs(engine_flip.new_weight - engine_flip.old_weight)
+
+
+def test_flip_uses_engine_winner():
+    # Con il costo rovesciato vince la seconda alternativa, con la somma ponderata la prima
+    weights = np.array([5, 4])
+    scores = np.array([[9, 2], [5, 5]])
+    directions = [COST, 1]
+    engine = ENGINES["normalized"]
+    assert engine.rank(weights, scores, directions).ranking[0, 0] == 1
+    flip = minimal_flip(weights, scores, engine=engine, directions=directions)
+    assert flip is None or flip.challenger == 0
+    probabilities = rank_probabilities(weights, scores, n_samples=2000, seed=1, engine=engine,
+                                       directions=directions)
+    assert probabilities[1] > probabilities[0]
+
+
+def test_contributions_add_up_to_totals():
+    rng = np.random.default_rng(3)
+    weights = rng.integers(1, 11, (4, 6))
+    scores = rng.integers(1, 11, (4, 6, 3))
+    directions = rng.choice([1, COST], 6)
+    for name in ("weighted_sum", "normalized", "ahp"):
+        engine = ENGINES[name]
+        assert np.allclose(engine.contributions(weights, scores, directions).sum(axis=1),
+                           engine.totals(weights, scores, directions))
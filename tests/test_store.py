@@ -0,0 +1,56 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from store import Submission, SubmissionStore
+
+
+def submission(user_name="Teo", catalog="casa"):
+    return Submission(user_name, catalog, ("Prezzo", "Zona"), ("A", "B"),
+                      np.array([5, 3]), np.array([[1, 2], [3, 4]]))
+
+
+def test_failed_flush_keeps_rows(tmp_path, monkeypatch):
+    store = SubmissionStore(tmp_path / "s.sqlite3", flush_interval=60)
+    store.add(submission("Uno"))
+    original = store.connection
+
+    def broken():
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(store, "connection", broken)
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush()
+    store.add(submission("Due"))
+    monkeypatch.setattr(store, "connection", original)
+    assert [s.user_name for s in store.submissions()] == ["Uno", "Due"]
+    store.close()
+
+
+def test_latest_submission_per_rater(tmp_path):
+    store = SubmissionStore(tmp_path / "s.sqlite3")
+    store.add(submission("Teo")._replace(rater="sessione-1"))
+    store.add(submission("Teo")._replace(rater="sessione-1", weights=np.array([1, 1])))
+    store.add(submission("Ada")._replace(rater="sessione-2"))
+    store.add(submission("Teo")._replace(rater="sessione-1", catalog="lampade"))
+    store.add(submission("Senza sessione"))
+    store.add(submission("Senza sessione"))
+    rows = store.submissions("casa")
+    assert [(s.user_name, s.rater) for s in rows] == [
+        ("Teo", "sessione-1"), ("Ada", "sessione-2"), ("Senza sessione", ""), ("Senza sessione", "")]
+    assert rows[0].weights.tolist() == [1, 1]
+    assert store.counts() == {"casa": 4, "lampade": 1}
+    store.close()
+
+
+def test_old_store_gets_rater_column(tmp_path):
+    path = tmp_path / "s.sqlite3"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE submissions (id INTEGER PRIMARY KEY, user_name TEXT NOT NULL,"
+                     " catalog TEXT NOT NULL, created_at REAL NOT NULL, factors TEXT NOT NULL,"
+                     " alternatives TEXT NOT NULL, weights BLOB NOT NULL, scores BLOB NOT NULL)")
+    store = SubmissionStore(path)
+    store.add(submission()._replace(rater="sessione-1"))
+    assert store.submissions()[0].rater == "sessione-1"
+    store.close()
@@ -0,0 +1,208 @@
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from telegram_outbox import FAILED, PENDING, SENT, Outbox, TelegramSender
+
+
+def test_enqueue_deduplicates(tmp_path):
+    outbox = Outbox(tmp_path / "o.sqlite3")
+    first = outbox.enqueue(1, "a.xlsx", b"dati", "application/octet-stream")
+    assert outbox.enqueue(1, "a.xlsx", b"dati", "application/octet-stream") == first
+    assert outbox.enqueue(2, "a.xlsx", b"dati", "application/octet-stream") != first
+
+
+def test_failed_message_is_queued_again(tmp_path):
+    outbox = Outbox(tmp_path / "o.sqlite3")
+    message_id = outbox.enqueue(1, "a.xlsx", b"dati", "application/octet-stream")
+    outbox.claim_due()
+    outbox.mark_failed(message_id, "HTTP 500")
+    assert outbox.status(message_id) == (FAILED, 1, "HTTP 500")
+
+    assert outbox.enqueue(1, "a.xlsx", b"dati", "application/octet-stream") == message_id
+    assert outbox.status(message_id) == (PENDING, 0, None)
+    assert [row[0] for row in outbox.claim_due()] == [message_id]
+
+
+def test_sent_message_is_not_sent_again(tmp_path):
+    outbox = Outbox(tmp_path / "o.sqlite3")
+    message_id = outbox.enqueue(1, "a.xlsx", b"dati", "application/octet-stream")
+    outbox.claim_due()
+    outbox.mark_sent(message_id)
+    outbox.enqueue(1, "a.xlsx", b"dati", "application/octet-stream")
+    assert outbox.status(message_id) == (SENT, 1, None)
+    assert outbox.claim_due() == []
+
+
+def test_concurrent_claims_never_share_messages(tmp_path):
+    # Due repliche dell'app sullo stesso file
+    first, second = Outbox(tmp_path / "o.sqlite3"), Outbox(tmp_path / "o.sqlite3")
+    expected = {first.enqueue(1, f"{n}.xlsx", b"dati", "application/octet-stream") for n in range(200)}
+    claimed = {first: [], second: []}
+    start = threading.Barrier(2)
+
+    def drain(outbox):
+        start.wait()
+        while rows := outbox.claim_due(limit=3):
+            claimed[outbox].extend(row[0] for row in rows)
+
+    threads = [threading.Thread(target=drain, args=(outbox,)) for outbox in claimed]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = claimed[first] + claimed[second]
+    assert len(ids) == len(set(ids)) and set(ids) == expected
+
+
+def test_claims_of_other_processes_expire(tmp_path):
+    outbox = Outbox(tmp_path / "o.sqlite3", claim_timeout=0.2)
+    message_id = outbox.enqueue(1, "a.xlsx", b"dati", "application/octet-stream")
+    assert [row[0] for row in outbox.claim_due()] == [message_id]
+    # Un processo che si avvia non rimette in coda i messaggi in invio degli altri
+    replica = Outbox(tmp_path / "o.sqlite3", claim_timeout=0.2)
+    assert replica.claim_due() == []
+    assert 0 < replica.next_due_in() <= 0.2
+    time.sleep(0.25)
+    assert [row[0] for row in replica.claim_due()] == [message_id]
+
+
+def test_sender_survives_errors(tmp_path):
+    outbox = Outbox(tmp_path / "o.sqlite3")
+    sender = TelegramSender(outbox, "token", api_url="http://127.0.0.1:9", backoff_base=0.01)
+    calls = []
+
+    def send(chat_id, filename, mime, payload):
+        calls.append(filename)
+        if len(calls) == 1:
+            raise RuntimeError("errore imprevisto")
+        return None
+
+    sender.send = send
+    message_id = outbox.enqueue(1, "a.xlsx", b"dati", "application/octet-stream")
+    sender.start()
+    deadline = time.monotonic() + 5
+    while outbox.status(message_id)[0] != SENT and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sender.stop(timeout=5)
+    assert outbox.status(message_id)[0] == SENT
+    assert calls == ["a.xlsx", "a.xlsx"]
+
+
+class TelegramStub(BaseHTTPRequestHandler):
+    """Finto Bot API: risponde con le risposte in ``responses`` (stato, corpo, ritardo), poi ``ok``."""
+    responses = []
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        TelegramStub.requests.append((self.path, body))
+        status, payload, delay = TelegramStub.responses.pop(0) if TelegramStub.responses else (200, {"ok": True}, 0)
+        time.sleep(delay)
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except OSError:
+            pass  # il client ha già chiuso per timeout
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def telegram():
+    TelegramStub.responses, TelegramStub.requests = [], []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TelegramStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def make_sender(tmp_path, api_url, **options):
+    outbox = Outbox(tmp_path / "o.sqlite3")
+    sender = TelegramSender(outbox, "token", api_url=api_url, **options)
+    return outbox, sender, outbox.enqueue(42, "a.xlsx", b"dati excel", "application/octet-stream")
+
+
+def test_document_is_sent(tmp_path, telegram):
+    outbox, sender, message_id = make_sender(tmp_path, telegram)
+    assert sender.process_due() == 1
+    assert outbox.status(message_id) == (SENT, 1, None)
+    (path, body), = TelegramStub.requests
+    assert path == "/bottoken/sendDocument"
+    assert b'name="chat_id"' in body and b"42" in body and b"dati excel" in body
+
+
+def test_server_error_is_retried_with_backoff(tmp_path, telegram):
+    outbox, sender, message_id = make_sender(tmp_path, telegram, backoff_base=30, max_attempts=2)
+    TelegramStub.responses = [(500, {"ok": False}, 0), (502, {"ok": False}, 0)]
+    sender.process_due()
+    status, attempts, error = outbox.status(message_id)
+    assert (status, attempts) == (PENDING, 1) and error.startswith("HTTP 500")
+    assert 25 < outbox.next_due_in() <= 30
+    assert sender.process_due() == 0  # non ancora scaduto
+
+    with sqlite3.connect(outbox.path) as conn:
+        conn.execute("UPDATE outbox SET next_attempt_at = 0")
+    sender.process_due()
+    status, attempts, error = outbox.status(message_id)
+    assert (status, attempts) == (FAILED, 2) and error.startswith("HTTP 502")
+
+
+def test_too_many_requests_uses_retry_after(tmp_path, telegram):
+    outbox, sender, message_id = make_sender(tmp_path, telegram, backoff_base=1)
+    TelegramStub.responses = [(429, {"ok": False, "parameters": {"retry_after": 120}}, 0)]
+    sender.process_due()
+    assert outbox.status(message_id)[:2] == (PENDING, 1)
+    assert 115 < outbox.next_due_in() <= 120
+
+
+def test_timeout_is_retried(tmp_path, telegram):
+    outbox, sender, message_id = make_sender(tmp_path, telegram, timeout=(1, 0.2), backoff_base=30)
+    TelegramStub.responses = [(200, {"ok": True}, 1.0)]
+    sender.process_due()
+    status, attempts, error = outbox.status(message_id)
+    assert (status, attempts) == (PENDING, 1) and "timed out" in error.lower()
+
+
+def test_sender_thread_delivers(tmp_path, telegram):
+    outbox, sender, message_id = make_sender(tmp_path, telegram, backoff_base=0.05)
+    TelegramStub.responses = [(503, {"ok": False}, 0)]
+    sender.start()
+    deadline = time.monotonic() + 5
+    while outbox.status(message_id)[0] != SENT and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sender.stop(timeout=5)
+    assert outbox.status(message_id)[:2] == (SENT, 2)
+
+
+def payload_size(outbox, message_id):
+    with sqlite3.connect(outbox.path) as conn:
+        return conn.execute("SELECT length(payload) FROM outbox WHERE id = ?", (message_id,)).fetchone()[0]
+
+
+def test_finished_messages_drop_their_payload(tmp_path, telegram):
+    outbox, sender, message_id = make_sender(tmp_path, telegram, max_attempts=1)
+    sender.process_due()
+    assert outbox.status(message_id)[0] == SENT and payload_size(outbox, message_id) == 0
+    # Ancora deduplicato: lo stesso file non viene inviato di nuovo
+    assert outbox.enqueue(42, "a.xlsx", b"dati excel", "application/octet-stream") == message_id
+    assert outbox.claim_due() == []
+
+    TelegramStub.responses = [(500, {"ok": False}, 0)]
+    failed = outbox.enqueue(42, "b.xlsx", b"altri dati", "application/octet-stream")
+    sender.process_due()
+    assert outbox.status(failed)[0] == FAILED and payload_size(outbox, failed) == 0
+    outbox.enqueue(42, "b.xlsx", b"altri dati", "application/octet-stream")
+    sender.process_due()
+    assert outbox.status(failed)[0] == SENT
+    assert TelegramStub.requests[-1][1].count(b"altri dati") == 1